@@ -0,0 +1,47 @@
+# benchmarks/classify_statements.py
+#
+# Micro-benchmark: cost of turning one source line into a statement node
+# (tokenizing and classifying it), as used by interpret_line and by the
+# parser for every line of a program.
+#
+#     python benchmarks/classify_statements.py [repeat]
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pathetic.parser import parse_line  # noqa: E402
+
+STATEMENTS = [
+    'let x = 10',
+    'let numbers[3] = 1, 2, 3',
+    'x = x + 1',
+    'count++',
+    'total += i * 2',
+    'numbers[i] = i * i',
+    'say "Hello, World!\\n"',
+    'say f"Countdown: {count}\\n"',
+    'get(n)',
+    'get(values[10])',
+    'return a + b',
+    'greet("bob")',
+    'x * 2 + 1',
+]
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    total = 0.0
+    print(f"{'statement':<32} {'ns/stmt':>9}")
+    for text in STATEMENTS:
+        seconds = min(timeit.repeat(lambda: parse_line(text), number=repeat, repeat=5))
+        per = seconds / repeat * 1e9
+        total += per
+        print(f"{text:<32} {per:>9.0f}")
+    print(f"{'mean':<32} {total / len(STATEMENTS):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# pathetic/arrays.py
+#
+# Numeric Pathetic arrays are stored unboxed in array.array buffers: 8 bytes
+# per element, O(1) indexed reads and writes straight from C. Integers use
+# typecode 'q' (int64) and anything with a float in it uses 'd' (float64).
+# Arrays holding strings, or integers too large for int64, are ObjectArrays,
+# Python lists with the same operators. Slicing either kind in Pathetic
+# gives the same kind of array (see array_slice).
+#
+# Arithmetic on arrays is elementwise (`a + b`, `a * 2`, `1 / a`, ...) and
+# sum/min/max/len/dot are available as built-in functions. Large arrays are
+# handed to NumPy when it is installed; otherwise a pure-Python loop is used.
+# Both give the same results: int64 arithmetic wraps around where Python
+# ints grow, so integer operations only go to NumPy when their operands are
+# small enough that the result cannot overflow.
+
+import array
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INT = "q"
+FLOAT = "d"
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+class _Elementwise:
+    """Elementwise arithmetic; `|` and `^` reach these as % and **."""
+
+    __slots__ = ()
+
+    def __add__(self, other):
+        return elementwise(operator.add, self, other)
+
+    def __radd__(self, other):
+        return elementwise(operator.add, other, self)
+
+    def __sub__(self, other):
+        return elementwise(operator.sub, self, other)
+
+    def __rsub__(self, other):
+        return elementwise(operator.sub, other, self)
+
+    def __mul__(self, other):
+        return elementwise(operator.mul, self, other)
+
+    def __rmul__(self, other):
+        return elementwise(operator.mul, other, self)
+
+    def __truediv__(self, other):
+        return elementwise(operator.truediv, self, other)
+
+    def __rtruediv__(self, other):
+        return elementwise(operator.truediv, other, self)
+
+    def __mod__(self, other):
+        return elementwise(operator.mod, self, other)
+
+    def __rmod__(self, other):
+        return elementwise(operator.mod, other, self)
+
+    def __pow__(self, other):
+        return elementwise(operator.pow, self, other)
+
+    def __rpow__(self, other):
+        return elementwise(operator.pow, other, self)
+
+    def __neg__(self):
+        return elementwise(operator.mul, self, -1)
+
+    def __pos__(self):
+        return self
+
+
+class Array(_Elementwise, array.array):
+    """A typed numeric array that prints like a list."""
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    __str__ = __repr__
+
+    def __reduce__(self):
+        return (type(self), (self.typecode, self.tobytes()))
+
+
+class ObjectArray(_Elementwise, list):
+    """An array of values that an Array cannot hold: strings, mixed values
+    or integers beyond int64."""
+
+    __slots__ = ()
+
+
+def infer_typecode(values):
+    """INT, FLOAT, or None when the values need an ObjectArray."""
+    typecode = INT
+    for value in values:
+        kind = type(value)
+        if kind is float:
+            typecode = FLOAT
+        elif kind is not int or not _INT64_MIN <= value <= _INT64_MAX:
+            return None
+    return typecode
+
+
+def make_array(values, size):
+    """Build the value for `let name[size] = values` or `get(name[size])`.
+
+    Numeric arrays always have exactly `size` elements, padded with zeros
+    when fewer values are given. A string initializer is kept as a string.
+    """
+    if isinstance(values, str):
+        return values[:size]
+    values = values[:size]
+    typecode = infer_typecode(values)
+    if typecode is None:
+        return ObjectArray(values)
+    result = Array(typecode, values)
+    if len(values) < size:
+        result.frombytes(bytes(result.itemsize * (size - len(values))))
+    return result
+
+
+# --- Bulk operations ---
+
+# Below this many elements the NumPy round trip costs more than it saves.
+NUMPY_THRESHOLD = 64
+
+if numpy is not None:
+    _UFUNCS = {
+        operator.add: numpy.add,
+        operator.sub: numpy.subtract,
+        operator.mul: numpy.multiply,
+        operator.truediv: numpy.true_divide,
+        operator.mod: numpy.mod,
+        operator.pow: numpy.power,
+    }
+
+
+def _is_sequence(value):
+    return isinstance(value, (array.array, list))
+
+
+def _is_number(value):
+    return type(value) in (int, float, bool)
+
+
+def _to_numpy(value):
+    if isinstance(value, array.array):
+        return numpy.frombuffer(value, dtype=numpy.int64 if value.typecode == INT else numpy.float64)
+    if isinstance(value, list):
+        return numpy.array(value)
+    return value
+
+
+def _from_numpy(result):
+    kind = result.dtype.kind
+    if kind == "f":
+        return Array(FLOAT, result.astype(numpy.float64, copy=False).tobytes())
+    if kind in "iub":
+        return Array(INT, result.astype(numpy.int64, copy=False).tobytes())
+    return ObjectArray(result.tolist())
+
+
+def _largest(value):
+    """The largest absolute value in an integer operand (a NumPy array or a
+    scalar) as a Python int."""
+    if isinstance(value, numpy.ndarray):
+        return max(-int(value.min()), int(value.max()))
+    return abs(int(value))
+
+
+def _exact(op, x, y):
+    """Whether NumPy computes op on the NumPy operands x and y exactly as
+    the Python loop would."""
+    for value in (x, y):
+        if type(value) is int and not _INT64_MIN <= value <= _INT64_MAX:
+            return False
+    if any(type(value) is float or isinstance(value, numpy.ndarray) and value.dtype.kind == "f"
+           for value in (x, y)):
+        # The same IEEE operation either way, but for power, which NumPy
+        # computes its own way, sometimes a little differently
+        return op is not operator.pow
+    if op is operator.mod:
+        return True
+    if op is operator.truediv:
+        # Each side is converted to a float first; Python divides exactly
+        return _largest(x) <= 2 ** 53 and _largest(y) <= 2 ** 53
+    if op is operator.pow:
+        exponent = int(y.max()) if isinstance(y, numpy.ndarray) else int(y)
+        least = int(y.min()) if isinstance(y, numpy.ndarray) else exponent
+        return least >= 0 and _largest(x).bit_length() * exponent < 63
+    if op is operator.mul:
+        return _largest(x) * _largest(y) <= _INT64_MAX
+    return _largest(x) + _largest(y) <= _INT64_MAX
+
+
+def _pack(values):
+    typecode = infer_typecode(values)
+    return ObjectArray(values) if typecode is None else Array(typecode, values)
+
+
+def elementwise(op, left, right):
+    """Apply a binary operator element by element.
+
+    Either side may be a scalar, which is applied to every element; two
+    arrays must have the same length.
+    """
+    left_seq, right_seq = _is_sequence(left), _is_sequence(right)
+    if not (left_seq or _is_number(left)) or not (right_seq or _is_number(right)):
+        return NotImplemented
+    if left_seq and right_seq and len(left) != len(right):
+        raise ValueError(f"arrays have different lengths ({len(left)} and {len(right)})")
+    size = len(left) if left_seq else len(right)
+    if (numpy is not None and size >= NUMPY_THRESHOLD
+            and all(isinstance(value, array.array) for value in (left, right) if _is_sequence(value))):
+        x, y = _to_numpy(left), _to_numpy(right)
+        if _exact(op, x, y):
+            try:
+                with numpy.errstate(divide="raise", over="raise", invalid="raise"):
+                    return _from_numpy(_UFUNCS[op](x, y))
+            except FloatingPointError:
+                # Division by zero, overflow or a complex power: Python decides
+                pass
+    if not left_seq:
+        return _pack([op(left, value) for value in right])
+    if not right_seq:
+        return _pack([op(value, right) for value in left])
+    return _pack(list(map(op, left, right)))
+
+
+def _use_numpy(values):
+    return numpy is not None and isinstance(values, array.array) and len(values) >= NUMPY_THRESHOLD
+
+
+def array_sum(values):
+    if _use_numpy(values):
+        x = _to_numpy(values)
+        if values.typecode == FLOAT or len(values) * _largest(x) <= _INT64_MAX:
+            return x.sum().item()
+    return sum(values)
+
+
+def array_min(*args):
+    if len(args) > 1:
+        return min(args)
+    values = args[0]
+    if not len(values):
+        raise ValueError("min() of an empty array")
+    if _use_numpy(values):
+        return _to_numpy(values).min().item()
+    return min(values)
+
+
+def array_max(*args):
+    if len(args) > 1:
+        return max(args)
+    values = args[0]
+    if not len(values):
+        raise ValueError("max() of an empty array")
+    if _use_numpy(values):
+        return _to_numpy(values).max().item()
+    return max(values)
+
+
+def array_dot(left, right):
+    if len(left) != len(right):
+        raise ValueError(f"arrays have different lengths ({len(left)} and {len(right)})")
+    if _use_numpy(left) and isinstance(right, array.array):
+        x, y = _to_numpy(left), _to_numpy(right)
+        if FLOAT in (left.typecode, right.typecode) or len(left) * _largest(x) * _largest(y) <= _INT64_MAX:
+            return numpy.dot(x, y).item()
+    return sum(map(operator.mul, left, right))
+
+
+def array_slice(values, start, stop, step):
+    """values[start:stop:step] for a slice in a Pathetic expression: an
+    array gives an array of the same kind, not a plain list or array.array.
+
+    Element reads (values[i]) do not come through here, so they stay as
+    fast as the underlying type makes them.
+    """
+    result = values[start:stop:step]
+    if isinstance(values, Array):
+        return Array(values.typecode, result.tobytes())
+    if isinstance(values, ObjectArray):
+        return ObjectArray(result)
+    return result
+
+
+# Built-in functions callable from Pathetic: name -> (function, min args, max args)
+BUILTINS = {
+    "sum": (array_sum, 1, 1),
+    "min": (array_min, 1, None),
+    "max": (array_max, 1, None),
+    "len": (len, 1, 1),
+    "dot": (array_dot, 2, 2),
+}
@@ -0,0 +1,174 @@
+# pathetic/batch.py
+#
+# `pathetic batch`: run many .pth scripts on a pool of worker processes.
+#
+# Starting Python and importing the interpreter costs far more than running
+# a typical small script, so scripts are handed to long-lived workers
+# (concurrent.futures.ProcessPoolExecutor) that pay it once and keep their
+# expression and statement caches warm. Each script runs in a fresh
+# Interpreter with its say output and its error messages captured
+# separately, and gets its input from `<name>.in` next to it when that
+# file exists. A script that runs longer than the timeout is interrupted
+# with SIGALRM inside its worker (where the platform has it) and reported
+# as timed out; the worker moves on to the next script.
+#
+# Results come back as one JSON object per script, in the order the
+# scripts were found.
+
+import glob
+import io
+import json
+import os
+import signal
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from .cache import load_code
+from .errors import LimitExceeded, PatheticError
+from .inputs import TokenReader
+from .interpreter import Interpreter
+
+# Seconds a script may run before it is stopped; None or 0 means no limit
+DEFAULT_TIMEOUT = 30.0
+INPUT_SUFFIX = ".in"
+
+
+class ScriptTimeout(BaseException):
+    """Raised inside a worker when its script runs out of time.
+
+    Like KeyboardInterrupt it is not an Exception, so the handlers that
+    turn Python errors into Pathetic errors let it through.
+    """
+
+
+def find_scripts(paths):
+    """The .pth files named by paths (files, directories or glob patterns), sorted.
+
+    Directories are searched recursively; patterns may use **.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(glob.glob(os.path.join(path, "**", "*.pth"), recursive=True))
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            found.extend(name for name in glob.glob(path, recursive=True) if name.endswith(".pth"))
+    return sorted(set(found))
+
+
+def init_worker():
+    """Set up a pool worker: Ctrl-C is for the parent, which shuts the pool down.
+
+    The pool already keeps every core busy, so parallel for loops run in
+    the worker.
+    """
+    from . import parallel
+
+    parallel.init_worker()
+
+
+def _on_alarm(signum, frame):
+    raise ScriptTimeout()
+
+
+def _timeout_message(timeout):
+    return f"Timeout: Stopped after {timeout:g} seconds"
+
+
+def run_captured(load, input_source, timeout=DEFAULT_TIMEOUT, limits=None):
+    """Run the Code that load() returns with its output and errors captured.
+
+    load raises OSError or PatheticError when there is nothing to run;
+    limits is a pathetic.limits.Limits or None. Returns a record with
+    status "ok", "error" (the program printed an error), "limit" (it used
+    up one of its limits), "timeout" or "crash" (the interpreter itself
+    failed), the duration in seconds, and the output and error text.
+    """
+    output = io.StringIO()
+    errors = io.StringIO()
+    interpreter = Interpreter(output=output, errors=errors)
+    alarm = bool(timeout) and hasattr(signal, "SIGALRM")
+    status = "ok"
+    start = time.perf_counter()
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        try:
+            try:
+                code = load()
+            except OSError as e:
+                interpreter.report(f"Error: Cannot read '{e.filename}': {e.strerror}")
+            except PatheticError as e:
+                interpreter.report(e)
+            else:
+                interpreter.run_code(code, input_source=input_source, limits=limits)
+        finally:
+            # An alarm going off before this still lands in the handlers below
+            if alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except ScriptTimeout:
+        status = "timeout"
+        interpreter.report(_timeout_message(timeout))
+    except Exception:
+        status = "crash"
+        errors.write(traceback.format_exc())
+    finally:
+        if alarm:
+            signal.signal(signal.SIGALRM, previous)
+        input_source.close()
+    duration = time.perf_counter() - start
+    if status == "ok" and errors.getvalue():
+        status = "limit" if isinstance(interpreter.last_error, LimitExceeded) else "error"
+    return {
+        "status": status,
+        "duration": round(duration, 6),
+        "output": output.getvalue(),
+        "errors": errors.getvalue(),
+    }
+
+
+def run_script(path, timeout=DEFAULT_TIMEOUT, use_cache=True, limits=None):
+    """Run one script in this process; returns its result record."""
+    input_path = os.path.splitext(path)[0] + INPUT_SUFFIX
+    try:
+        input_source = TokenReader.open(input_path) if os.path.isfile(input_path) else TokenReader(io.BytesIO())
+        record = run_captured(lambda: load_code(path, use_cache), input_source, timeout, limits)
+    except ScriptTimeout:
+        # Only the script's own timeout raises it; one stray alarm must not end the batch
+        record = {"status": "timeout", "duration": timeout, "output": "",
+                  "errors": _timeout_message(timeout) + "\n"}
+    return {"path": path, **record}
+
+
+def run_batch(paths, jobs=None, timeout=DEFAULT_TIMEOUT, use_cache=True, limits=None):
+    """Run every script under paths on jobs worker processes.
+
+    Yields result records in script order as they become available.
+    """
+    scripts = find_scripts(paths)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as pool:
+        futures = [pool.submit(run_script, path, timeout, use_cache, limits) for path in scripts]
+        for path, future in zip(scripts, futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker process died (e.g. killed or out of memory)
+                yield {"path": path, "status": "crash", "duration": None,
+                       "output": "", "errors": f"{type(e).__name__}: {e}"}
+
+
+def summarize(records, elapsed):
+    """One line totalling the records' statuses."""
+    counts = {}
+    for record in records:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    parts = ", ".join(f"{counts[status]} {status}"
+                      for status in ("ok", "error", "limit", "timeout", "crash") if status in counts)
+    return f"{len(records)} scripts in {elapsed:.2f} s: {parts or 'nothing to do'}"
+
+
+def write_record(record, stream):
+    stream.write(json.dumps(record) + "\n")
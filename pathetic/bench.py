@@ -0,0 +1,173 @@
+# pathetic/bench.py
+#
+# `pathetic bench`: time .pth workloads and track them between commits.
+#
+# Each program is compiled once, then run `warmup` times untimed and
+# `repeat` times timed, every run with fresh variables and functions and
+# with its output discarded. One extra run under tracemalloc records peak
+# memory. A program may declare how much work it does with a comment line
+# `// ops: N` (loop iterations, calls, ...); ops/sec is N over the median
+# run time, and 1 run counts as 1 op otherwise.
+#
+# Results can be written as JSON and a later run compared against them:
+# a benchmark whose median time grew by more than the threshold is
+# reported as a regression.
+
+import glob
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+from . import __version__
+from .compiler import compile_source
+from .errors import PatheticError
+from .output import OutputSink
+from .vm import VM
+
+DEFAULT_WARMUP = 1
+DEFAULT_REPEAT = 5
+# Percent slowdown of the median that counts as a regression
+DEFAULT_THRESHOLD = 10.0
+
+_OPS = re.compile(r"^\s*//\s*ops:\s*(\d+)\s*$", re.MULTILINE)
+
+
+class _Discard:
+    """A stream that drops everything written to it."""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def find_benchmarks(paths):
+    """The .pth files named by paths (files, directories or glob patterns), sorted."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(glob.glob(os.path.join(path, "*.pth")))
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            found.extend(glob.glob(path))
+    return sorted(set(found))
+
+
+def run_once(code):
+    """Run compiled code in a fresh environment; returns elapsed seconds."""
+    vm = VM({}, output=OutputSink(_Discard(), 1 << 16))
+    start = time.perf_counter()
+    vm.run(code, {})
+    return time.perf_counter() - start
+
+
+def bench_file(path, warmup=DEFAULT_WARMUP, repeat=DEFAULT_REPEAT):
+    """Benchmark one program; returns its result dictionary."""
+    with open(path, "r") as f:
+        source = f.read()
+    match = _OPS.search(source)
+    ops = int(match.group(1)) if match else 1
+    code = compile_source(source)
+    for _ in range(warmup):
+        run_once(code)
+    times = [run_once(code) for _ in range(repeat)]
+
+    tracemalloc.start()
+    try:
+        run_once(code)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(times)
+    return {
+        "path": path,
+        "ops": ops,
+        "repeat": repeat,
+        "min": min(times),
+        "median": median,
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "ops_per_sec": ops / median if median else 0.0,
+        "peak_bytes": peak,
+    }
+
+
+def run_benchmarks(paths, warmup=DEFAULT_WARMUP, repeat=DEFAULT_REPEAT, report=print):
+    """Benchmark every program under paths; returns the full results document.
+
+    Programs that fail to compile or run are listed under "errors".
+    """
+    results = {}
+    errors = {}
+    for path in find_benchmarks(paths):
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            result = bench_file(path, warmup, repeat)
+        except PatheticError as e:
+            errors[name] = str(e)
+            report(f"{name:<20} error: {e}")
+            continue
+        results[name] = result
+        report(format_result(name, result))
+    return {
+        "pathetic": __version__,
+        "python": platform.python_version(),
+        "implementation": sys.implementation.name,
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "warmup": warmup,
+        "repeat": repeat,
+        "benchmarks": results,
+        "errors": errors,
+    }
+
+
+def format_result(name, result):
+    return (f"{name:<20} {result['median'] * 1000:>10.2f} ms "
+            f"+- {result['stdev'] * 1000:>7.2f}  {result['ops_per_sec']:>14,.0f} ops/s  "
+            f"{result['peak_bytes'] / 1024:>10,.0f} KiB peak")
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compare median times; returns (name, old, new, percent change, regressed) rows."""
+    rows = []
+    old_results = baseline.get("benchmarks", {})
+    for name, result in sorted(current.get("benchmarks", {}).items()):
+        old = old_results.get(name)
+        if old is None:
+            continue
+        change = (result["median"] - old["median"]) / old["median"] * 100 if old["median"] else 0.0
+        rows.append((name, old["median"], result["median"], change, change > threshold))
+    return rows
+
+
+def format_comparison(rows, threshold=DEFAULT_THRESHOLD):
+    lines = [f"{'benchmark':<20} {'baseline':>12} {'current':>12} {'change':>9}"]
+    for name, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        lines.append(f"{name:<20} {old * 1000:>9.2f} ms {new * 1000:>9.2f} ms {change:>+8.1f}%{flag}")
+    regressions = sum(1 for row in rows if row[4])
+    if regressions:
+        lines.append(f"{regressions} regression(s) over {threshold:g}%")
+    else:
+        lines.append(f"No regressions over {threshold:g}%")
+    return "\n".join(lines)
+
+
+def load_results(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
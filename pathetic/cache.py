@@ -0,0 +1,141 @@
+# pathetic/cache.py
+#
+# Compiled programs are cached next to their source, the way CPython caches
+# .pyc files:
+#
+#     scripts/job.pth  ->  scripts/__pthcache__/job.<tag>.pthc
+#
+# The tag names the interpreter version, the bytecode version and the Python
+# implementation (compiled expressions are Python code objects, which are
+# only valid for the Python that produced them). A cache file records the
+# source's size, mtime and SHA-256; it is used when size and mtime match,
+# or failing that when the hash matches, and rewritten otherwise. Code
+# compiled at a non-default optimization level is kept in a file of its own,
+# job.<tag>.opt-<level>.pthc.
+
+import hashlib
+import marshal
+import os
+import sys
+
+from . import __version__
+from .compiler import BYTECODE_VERSION, Code, compile_source
+from .errors import PatheticError
+from .optimizer import DEFAULT_OPT_LEVEL
+
+CACHE_DIR = "__pthcache__"
+CACHE_SUFFIX = ".pthc"
+MAGIC = b"PTHC"
+TAG = f"pathetic-{__version__}-b{BYTECODE_VERSION}-{sys.implementation.cache_tag}"
+
+
+def cache_path(source_path, opt_level=DEFAULT_OPT_LEVEL):
+    """Where the compiled form of source_path is stored."""
+    directory, filename = os.path.split(os.path.abspath(source_path))
+    stem = os.path.splitext(filename)[0]
+    level = "" if opt_level == DEFAULT_OPT_LEVEL else f".opt-{opt_level}"
+    return os.path.join(directory, CACHE_DIR, f"{stem}.{TAG}{level}{CACHE_SUFFIX}")
+
+
+def _read_cache(path, opt_level):
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            header = marshal.load(f)
+            if header.get("tag") != TAG or header.get("opt") != opt_level:
+                return None
+            return header, f.read()
+    except (OSError, EOFError, ValueError, TypeError, AttributeError):
+        return None
+
+
+def _write_cache(path, code, stat, digest, opt_level):
+    header = {
+        "tag": TAG,
+        "opt": opt_level,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "sha256": digest,
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            marshal.dump(header, f)
+            marshal.dump(code.to_data(), f)
+        os.replace(tmp, path)
+    except OSError:
+        # A read-only tree just means we run without a cache
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def load_code(source_path, use_cache=True, opt_level=DEFAULT_OPT_LEVEL):
+    """Return the Code for a .pth file, compiling it only if needed.
+
+    Raises OSError if the source cannot be read and PatheticSyntaxError if
+    it does not compile.
+    """
+    stat = os.stat(source_path)
+    path = cache_path(source_path, opt_level)
+    cached = _read_cache(path, opt_level) if use_cache else None
+    if cached is not None:
+        header, payload = cached
+        if header.get("size") == stat.st_size and header.get("mtime") == stat.st_mtime_ns:
+            code = _load_payload(payload)
+            if code is not None:
+                return code
+
+    with open(source_path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    if cached is not None and cached[0].get("sha256") == digest:
+        code = _load_payload(cached[1])
+        if code is not None:
+            # Touched but unchanged: refresh the stored mtime
+            _write_cache(path, code, stat, digest, opt_level)
+            return code
+
+    code = compile_source(raw.decode("utf-8"), opt_level)
+    if use_cache:
+        _write_cache(path, code, stat, digest, opt_level)
+    return code
+
+
+def _load_payload(payload):
+    try:
+        return Code.from_data(marshal.loads(payload))
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def compile_tree(paths, force=False, opt_level=DEFAULT_OPT_LEVEL):
+    """Precompile every .pth file under the given files or directories.
+
+    Yields (path, error) pairs; error is None on success.
+    """
+    for root in paths:
+        if os.path.isfile(root):
+            candidates = [root]
+        else:
+            candidates = []
+            for directory, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(d for d in dirnames if d != CACHE_DIR and not d.startswith("."))
+                candidates.extend(os.path.join(directory, name)
+                                  for name in sorted(filenames) if name.endswith(".pth"))
+        for source_path in candidates:
+            try:
+                if force:
+                    try:
+                        os.unlink(cache_path(source_path, opt_level))
+                    except OSError:
+                        pass
+                load_code(source_path, opt_level=opt_level)
+            except (OSError, PatheticError) as e:
+                yield source_path, e
+            else:
+                yield source_path, None
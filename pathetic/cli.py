@@ -1,21 +1,469 @@
+# Commands import what they use when they run, so that `pathetic run
+# --server` starts without loading the interpreter at all.
 import sys
-from .runner import run_file
+import time
+from . import __version__
 
-VERSION = "0.2.0"
+VERSION = __version__
 
 HELP_TEXT = """
 Usage:
   pathetic [file.pth]
-  pathetic run [file.pth]
+  pathetic run [--no-cache] [--output-buffer=SIZE] [--input FILE | --no-prompt]
+               [--profile] [--profile-output=FILE] [--server[=SOCKET]]
+               [--opt-level=N] [--dump-optimized] [LIMITS] [file.pth]
+  pathetic compile [--force] [--opt-level=N] [path ...]
+  pathetic bench [--warmup=N] [--repeat=N] [--json=FILE]
+                 [--compare=FILE] [--threshold=PCT] [path ...]
+  pathetic batch [--jobs N] [--timeout SECONDS] [--summary FILE]
+                 [--no-cache] [LIMITS] DIR|GLOB ...
+  pathetic serve [--socket PATH] [--jobs N] [--timeout SECONDS] [--no-cache]
+                 [LIMITS]
+
+Commands:
+  run               Run a program, reusing its cached bytecode when current
+  compile           Precompile every .pth file under the given files or
+                    directories (default: current directory) into
+                    __pthcache__/
+  bench             Time the .pth programs under the given files,
+                    directories or globs (default: benchmarks/) and
+                    report ops/sec and peak memory
+  batch             Run every .pth script under the given directories or
+                    globs on a pool of worker processes and write one JSON
+                    line per script (path, status, duration, output,
+                    errors); a script reads get values from <name>.in
+  serve             Keep warm interpreter processes running and execute
+                    programs sent to a Unix socket (see run --server)
 
 Options:
   -v, --version     Show version information
   -h, --help        Show this help message with syntax guide
+  --no-cache        Neither read nor write __pthcache__ files
+  --force           Recompile even when the cache is up to date
+  --output-buffer=SIZE
+                    Buffer this much program output before writing it
+                    (e.g. 0, 4096, 64k, 1m). Default: unbuffered on a
+                    terminal, 64k otherwise
+  --input FILE      Read get values from FILE instead of prompting: each
+                    get takes the next whitespace-separated value(s)
+  --no-prompt       Read get values the same way from standard input
+  --profile         Report hit counts and self/cumulative time per line
+                    and per function on stderr, and save a pstats profile
+                    to <name>.prof
+  --profile-output=FILE
+                    Save the profile to FILE instead (implies --profile);
+                    a .json file is written in speedscope format
+  --opt-level=N     Optimize the program before compiling it: 0 not at all,
+                    1 fold constant expressions and drop if branches that
+                    can never run, 2 (default) also replace variables that
+                    are set once to a constant by their value
+  --dump-optimized  Print the program as the optimizer rewrote it instead
+                    of running it
+  --warmup=N        Untimed runs before measuring (default 1)
+  --repeat=N        Timed runs per benchmark (default 5)
+  --json=FILE       Write benchmark results to FILE as JSON
+  --compare=FILE    Compare with earlier --json results; exit with status 1
+                    when a benchmark got slower than the threshold
+  --threshold=PCT   Slowdown that counts as a regression (default 10)
+  --server[=SOCKET] Run the program on a `pathetic serve` server listening
+                    on SOCKET (default: the default --socket); get values
+                    come from --input or standard input
+  --socket PATH     Unix socket for serve (default: pathetic.sock in
+                    $XDG_RUNTIME_DIR, or in a private pathetic-UID
+                    directory in the temporary directory)
+  --jobs N          Worker processes for batch and serve (default: one
+                    per CPU)
+  --timeout SECONDS Stop a batch script after this long (default 30; 0 for
+                    no limit); for serve, the most any request may run
+                    (default: no limit)
+  --summary FILE    Write the batch JSON lines to FILE instead of stdout
+
+Limits (stop a program with a "Limit exceeded" error):
+  --max-steps N     Loop iterations plus function calls
+  --time-limit SECONDS
+                    Wall-clock time
+  --max-memory SIZE Approximate string and array data held in variables
+                    (e.g. 64k, 100m)
+  --max-array N     Elements in any one array
 
 Syntax Guide:
   say "hello"         → Output: hello
 """
 
+def _size(text):
+    from .output import parse_buffer_size
+    return parse_buffer_size(text)
+
+# Options setting pathetic.limits.Limits, shared by run, batch and serve:
+# option -> (Limits argument, value parser)
+LIMIT_OPTIONS = {
+    "--max-steps": ("max_steps", int),
+    "--time-limit": ("time_limit", float),
+    "--max-memory": ("max_memory", _size),
+    "--max-array": ("max_array", int),
+}
+
+def set_limit(name, value, limits):
+    """Store the value of limit option name in the limits dictionary; raises ValueError."""
+    key, parse = LIMIT_OPTIONS[name]
+    number = parse(value)
+    if number <= 0:
+        raise ValueError(f"{name} must be positive")
+    limits[key] = number
+
+def make_limits(limits):
+    """A Limits for the dictionary set_limit filled, or None when it is empty."""
+    if not limits:
+        return None
+    from .limits import Limits
+    return Limits(**limits)
+
+def opt_level(value):
+    """The level given to --opt-level; raises ValueError."""
+    from .optimizer import MAX_OPT_LEVEL
+
+    level = int(value)
+    if not 0 <= level <= MAX_OPT_LEVEL:
+        raise ValueError(f"--opt-level must be between 0 and {MAX_OPT_LEVEL}")
+    return level
+
+def dump_optimized(path, level):
+    """Print the program at path as the optimizer rewrites it."""
+    from .errors import PatheticError
+    from .optimizer import format_program, optimize
+    from .parser import parse
+
+    try:
+        with open(path, "r") as f:
+            source = f.read()
+    except OSError:
+        print(f"Error: File '{path}' not found.")
+        return
+    try:
+        program = optimize(parse(source), level)
+    except PatheticError as e:
+        print(e)
+        return
+    sys.stdout.write(format_program(program))
+
+def compile_command(args):
+    from .cache import compile_tree
+    from .optimizer import DEFAULT_OPT_LEVEL
+
+    force = False
+    level = DEFAULT_OPT_LEVEL
+    paths = []
+    args = iter(args)
+    for arg in args:
+        if arg == "--force":
+            force = True
+        elif arg == "--opt-level" or arg.startswith("--opt-level="):
+            try:
+                level = opt_level(arg.split("=", 1)[1] if "=" in arg else next(args, ""))
+            except ValueError:
+                print("Error: Invalid value for --opt-level.")
+                return 2
+        else:
+            paths.append(arg)
+    failed = 0
+    for path, error in compile_tree(paths or ["."], force=force, opt_level=level):
+        if error is None:
+            print(f"Compiled {path}")
+        else:
+            failed += 1
+            print(f"Error compiling {path}: {error}")
+    return 1 if failed else 0
+
+def bench_command(args):
+    from . import bench
+
+    options = {"--warmup": bench.DEFAULT_WARMUP, "--repeat": bench.DEFAULT_REPEAT,
+               "--json": None, "--compare": None, "--threshold": bench.DEFAULT_THRESHOLD}
+    paths = []
+    for arg in args:
+        name, _, value = arg.partition("=")
+        if name not in options:
+            paths.append(arg)
+            continue
+        try:
+            if name in ("--warmup", "--repeat"):
+                options[name] = int(value)
+            elif name == "--threshold":
+                options[name] = float(value)
+            elif not value:
+                raise ValueError
+            else:
+                options[name] = value
+        except ValueError:
+            print(f"Error: Invalid value for {name}.")
+            return 2
+    if options["--repeat"] < 1:
+        print("Error: --repeat must be at least 1.")
+        return 2
+    paths = paths or ["benchmarks"]
+    if not bench.find_benchmarks(paths):
+        print(f"Error: No .pth benchmarks found in {', '.join(paths)}.")
+        return 2
+    baseline = None
+    if options["--compare"] is not None:
+        try:
+            baseline = bench.load_results(options["--compare"])
+        except (OSError, ValueError) as e:
+            print(f"Error: Cannot read {options['--compare']}: {e}")
+            return 2
+    results = bench.run_benchmarks(paths, options["--warmup"], options["--repeat"])
+    if options["--json"] is not None:
+        bench.save_results(results, options["--json"])
+        print(f"Results written to {options['--json']}")
+    if results["errors"]:
+        return 1
+    if baseline is not None:
+        rows = bench.compare(baseline, results, options["--threshold"])
+        print()
+        print(bench.format_comparison(rows, options["--threshold"]))
+        if any(row[4] for row in rows):
+            return 1
+    return 0
+
+def batch_command(args):
+    from . import batch
+
+    options = {"--jobs": None, "--timeout": batch.DEFAULT_TIMEOUT, "--summary": None}
+    limits = {}
+    use_cache = True
+    paths = []
+    args = iter(args)
+    for arg in args:
+        if arg == "--no-cache":
+            use_cache = False
+            continue
+        name, equals, value = arg.partition("=")
+        if name not in options and name not in LIMIT_OPTIONS:
+            paths.append(arg)
+            continue
+        if not equals:
+            value = next(args, "")
+        try:
+            if name in LIMIT_OPTIONS:
+                set_limit(name, value, limits)
+            elif name == "--jobs":
+                options[name] = int(value)
+                if options[name] < 1:
+                    raise ValueError
+            elif name == "--timeout":
+                options[name] = float(value)
+                if options[name] < 0:
+                    raise ValueError
+            elif not value:
+                raise ValueError
+            else:
+                options[name] = value
+        except ValueError:
+            print(f"Error: Invalid value for {name}.")
+            return 2
+    if not paths:
+        print("Error: Missing scripts to run.")
+        return 2
+    if not batch.find_scripts(paths):
+        print(f"Error: No .pth scripts found in {', '.join(paths)}.")
+        return 2
+    summary = sys.stdout
+    if options["--summary"] is not None:
+        try:
+            summary = open(options["--summary"], "w")
+        except OSError as e:
+            print(f"Error: Cannot write {options['--summary']}: {e.strerror}")
+            return 2
+    records = []
+    start = time.perf_counter()
+    try:
+        for record in batch.run_batch(paths, options["--jobs"], options["--timeout"], use_cache,
+                                      make_limits(limits)):
+            records.append(record)
+            batch.write_record(record, summary)
+    finally:
+        if summary is not sys.stdout:
+            summary.close()
+    print(batch.summarize(records, time.perf_counter() - start), file=sys.stderr)
+    return 0 if all(record["status"] == "ok" for record in records) else 1
+
+def remote_run(path, socket_path, input_path, no_prompt, limits):
+    """Run the program at path on a `pathetic serve` server."""
+    from . import server
+
+    try:
+        with open(path, "r") as f:
+            source = f.read()
+    except OSError:
+        print(f"Error: File '{path}' not found.")
+        return
+    input_data = ""
+    if input_path is not None:
+        try:
+            with open(input_path, "r") as f:
+                input_data = f.read()
+        except OSError:
+            print(f"Error: Input file '{input_path}' not found.")
+            return
+    elif no_prompt or not sys.stdin.isatty():
+        input_data = sys.stdin.read()
+    try:
+        response = server.request({"source": source, "input": input_data, "limits": limits},
+                                  socket_path or server.DEFAULT_SOCKET)
+    except OSError as e:
+        print(f"Error: Cannot reach the server: {e}")
+        return
+    sys.stdout.write(response["output"])
+    sys.stdout.write(response["errors"])
+
+def serve_command(args):
+    from . import server
+
+    options = {"--socket": None, "--jobs": None, "--timeout": None}
+    limits = {}
+    use_cache = True
+    args = iter(args)
+    for arg in args:
+        if arg == "--no-cache":
+            use_cache = False
+            continue
+        name, equals, value = arg.partition("=")
+        if name not in options and name not in LIMIT_OPTIONS:
+            print(f"Error: Unknown option '{arg}'.")
+            return 2
+        if not equals:
+            value = next(args, "")
+        try:
+            if name in LIMIT_OPTIONS:
+                set_limit(name, value, limits)
+            elif name == "--jobs":
+                options[name] = int(value)
+                if options[name] < 1:
+                    raise ValueError
+            elif name == "--timeout":
+                options[name] = float(value)
+                if options[name] < 0:
+                    raise ValueError
+            elif not value:
+                raise ValueError
+            else:
+                options[name] = value
+        except ValueError:
+            print(f"Error: Invalid value for {name}.")
+            return 2
+    try:
+        server.serve(options["--socket"] or server.DEFAULT_SOCKET, options["--jobs"],
+                     options["--timeout"], use_cache, limits=limits)
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+def run_command(args):
+    from .output import parse_buffer_size
+
+    use_cache = True
+    buffer_size = None
+    input_path = None
+    no_prompt = False
+    profile = False
+    profile_output = None
+    server = None
+    level = None
+    dump = False
+    limits = {}
+    files = []
+    args = iter(args)
+    for arg in args:
+        if arg == "--no-cache":
+            use_cache = False
+        elif arg == "--opt-level" or arg.startswith("--opt-level="):
+            try:
+                level = opt_level(arg.split("=", 1)[1] if "=" in arg else next(args, ""))
+            except ValueError:
+                print("Error: Invalid value for --opt-level.")
+                return
+        elif arg == "--dump-optimized":
+            dump = True
+        elif arg == "--server" or arg.startswith("--server="):
+            server = arg.split("=", 1)[1] if "=" in arg else ""
+        elif arg == "--no-prompt":
+            no_prompt = True
+        elif arg == "--profile":
+            profile = True
+        elif arg == "--profile-output" or arg.startswith("--profile-output="):
+            profile = True
+            profile_output = arg.split("=", 1)[1] if "=" in arg else next(args, None)
+            if not profile_output:
+                print("Error: Missing file for --profile-output.")
+                return
+        elif arg == "--input" or arg.startswith("--input="):
+            input_path = arg.split("=", 1)[1] if "=" in arg else next(args, None)
+            if not input_path:
+                print("Error: Missing file for --input.")
+                return
+        elif arg.partition("=")[0] in LIMIT_OPTIONS:
+            name, equals, value = arg.partition("=")
+            try:
+                set_limit(name, value if equals else next(args, ""), limits)
+            except ValueError:
+                print(f"Error: Invalid value for {name}.")
+                return
+        elif arg == "--output-buffer" or arg.startswith("--output-buffer="):
+            value = arg.split("=", 1)[1] if "=" in arg else next(args, "")
+            try:
+                buffer_size = parse_buffer_size(value)
+            except ValueError:
+                print(f"Error: Invalid output buffer size '{value}'.")
+                return
+        elif arg.startswith("--"):
+            print(f"Error: Unknown option '{arg}'.")
+            return 2
+        else:
+            files.append(arg)
+    if not files:
+        print("Error: Missing file to run.")
+        return
+    if dump:
+        from .optimizer import DEFAULT_OPT_LEVEL
+        dump_optimized(files[0], DEFAULT_OPT_LEVEL if level is None else level)
+        return
+    if server is not None:
+        if level is not None:
+            print("Error: --opt-level cannot be used with --server.")
+            return
+        if profile:
+            print("Error: --profile cannot be used with --server.")
+            return
+        remote_run(files[0], server, input_path, no_prompt, limits)
+        return
+
+    from .inputs import TokenReader
+    from .optimizer import DEFAULT_OPT_LEVEL
+    from .output import OutputSink
+    from .profiler import Profiler, write_profile
+    from .runner import run_file
+
+    input_source = None
+    if input_path is not None:
+        try:
+            input_source = TokenReader.open(input_path)
+        except OSError:
+            print(f"Error: Input file '{input_path}' not found.")
+            return
+    elif no_prompt:
+        input_source = TokenReader(sys.stdin.buffer)
+    profiler = Profiler() if profile else None
+    try:
+        run_file(files[0], use_cache=use_cache, output=OutputSink(buffer_size=buffer_size),
+                 input_source=input_source, profiler=profiler, limits=make_limits(limits),
+                 opt_level=DEFAULT_OPT_LEVEL if level is None else level)
+    finally:
+        if input_source is not None:
+            input_source.close()
+    if profiler is not None and profiler.started is not None:
+        write_profile(profiler, files[0], profile_output)
+
 def main():
     args = sys.argv[1:]
 
@@ -32,11 +480,19 @@ def main():
         return
 
     if args[0] == "run":
-        if len(args) < 2:
-            print("Error: Missing file to run.")
-            return
-        run_file(args[1])
-        return
+        sys.exit(run_command(args[1:]))
+
+    if args[0] == "compile":
+        sys.exit(compile_command(args[1:]))
+
+    if args[0] == "bench":
+        sys.exit(bench_command(args[1:]))
+
+    if args[0] == "batch":
+        sys.exit(batch_command(args[1:]))
+
+    if args[0] == "serve":
+        sys.exit(serve_command(args[1:]))
 
     # Default: assume first argument is a file
-    run_file(args[0])
+    sys.exit(run_command(args))
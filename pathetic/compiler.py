@@ -0,0 +1,949 @@
+# pathetic/compiler.py
+#
+# Lowers the AST from pathetic.parser into bytecode for pathetic.vm.
+#
+# Each program and each function body becomes a Code object: a flat list of
+# (opcode, a, b) instructions. Function locals live in numbered slots that
+# are resolved here, at compile time; the top-level program keeps its
+# variables in the caller's dictionary so interpret(code, local_vars) still
+# sees them. Expressions are lowered to small Python functions taking
+# (L, G) -- the frame's slot list and the globals dictionary -- with every
+# variable reference already turned into L[slot] or G["name"]. Names a
+# function never assigns are globals; a local read before its first
+# assignment falls back to the global of the same name.
+
+import ast
+import copy
+import types
+
+from .arrays import BUILTINS, array_slice
+from .errors import PatheticError, PatheticSyntaxError
+from .expressions import SAFE_GLOBALS, split_fstring, translate_expression
+from .nodes import (
+    Assign, Call, CallStmt, Expr, ExprStmt, For, FuncDef, Get, If, Let, LetArray,
+    Return, Say, SayF, SetItem, While,
+)
+from .parser import parse
+from .values import format_value
+
+# Bump whenever the instruction set or Code layout changes; it is part of
+# the key for cached .pthc files.
+BYTECODE_VERSION = 12
+
+# --- Opcodes ---
+
+STORE_FAST = 0          # a=slot, b=expr           L[a] = b(L, G)
+STORE_NAME = 1          # a=name, b=expr           G[a] = b(L, G)
+STORE_FAST_CONST = 2    # a=slot, b=value
+STORE_NAME_CONST = 3    # a=name, b=value
+JUMP_IF_FALSE = 4       # a=expr, b=target
+JUMP = 5                # a=target
+SAY = 6                 # a=text (escapes already processed)
+SAY_F = 7               # a=expr rendering the f-string
+PRINT = 8               # a=expr
+CALL = 9                # a=(name, arg exprs, forbid None), b=dest (slot, name or None);
+                        # runs a built-in unless a user function has that name
+RETURN = 10             # a=expr
+RETURN_CONST = 11       # a=value
+GET = 12                # a=dest, b=(name, size)
+LET_ARRAY = 13          # a=dest, b=(size, values)
+MAKE_FUNCTION = 14      # a=Code
+TAIL_CALL = 15          # a=(name, arg exprs)      return name(args) in this frame
+STORE_ITEM = 16         # a=array expr, b=(index expr, value expr)
+FOR_RANGE = 17          # a=(var dest, iterator slot, end slot), b=(bound expr, comparison, step)
+FOR_NEXT = 18           # a=(iterator slot, end slot, exit target), b=var dest
+PARALLEL_FOR = 19       # a=(var dest, kernel Code, free names, written arrays, private (name, dest)s,
+                        # built-ins called), b=(bound expr, comparison, step, exit target);
+                        # runs the counted loop that follows on the workers, or falls through to it
+
+OPNAMES = [
+    "STORE_FAST", "STORE_NAME", "STORE_FAST_CONST", "STORE_NAME_CONST",
+    "JUMP_IF_FALSE", "JUMP", "SAY", "SAY_F", "PRINT", "CALL", "RETURN",
+    "RETURN_CONST", "GET", "LET_ARRAY", "MAKE_FUNCTION", "TAIL_CALL",
+    "STORE_ITEM", "FOR_RANGE", "FOR_NEXT", "PARALLEL_FOR",
+]
+
+# Marks a local slot that has not been assigned yet.
+UNBOUND = type("Unbound", (), {"__repr__": lambda self: "<unbound>"})()
+
+
+def _text(value):
+    """How a value reads inside an f-string."""
+    return "" if value is None else format_value(value)
+
+
+# Globals seen by compiled expression functions.
+EXPR_GLOBALS = {
+    "__builtins__": {},
+    "U": UNBOUND,
+    "F": _text,
+    "S": array_slice,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+    ast.Name, ast.Constant, ast.Subscript, ast.Slice, ast.List, ast.Tuple,
+    ast.IfExp, ast.Call, ast.Load, ast.operator, ast.unaryop, ast.boolop,
+    ast.cmpop,
+)
+
+# Comparisons a counted for loop may test its variable with.
+_LOOP_COMPARISONS = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">="}
+
+# Only values of these types are folded into instructions, so a folded
+# constant can never be shared and mutated between executions.
+_FOLDABLE = (int, float, str, bool, type(None))
+
+# Folded strings are at most this many characters, and folded integers
+# this many bits; exponents and shifts are no larger either.
+MAX_FOLDED_SIZE = 4096
+
+
+def cheap_operation(op, left, right):
+    """Whether left op right (an ast operator and two constant values) can
+    be computed at compile time without building a huge value.
+
+    Code that never runs must not cost anything, so large powers, shifts
+    and repetitions are left to run time.
+    """
+    if isinstance(op, (ast.Pow, ast.LShift)):
+        if type(right) in (int, float) and abs(right) > MAX_FOLDED_SIZE:
+            return False
+        if type(left) is int and type(right) in (int, float):
+            return abs(left).bit_length() * abs(right) <= MAX_FOLDED_SIZE
+        return True
+    if isinstance(op, ast.Mult):
+        for sequence, count in ((left, right), (right, left)):
+            if type(sequence) is str and type(count) in (int, bool):
+                return len(sequence) * count <= MAX_FOLDED_SIZE
+    return True
+
+
+def _folded_size_ok(value):
+    if type(value) is str:
+        return len(value) <= MAX_FOLDED_SIZE
+    if type(value) is int:
+        return abs(value).bit_length() <= MAX_FOLDED_SIZE
+    return True
+
+
+def _literal(node):
+    """(True, value) for a constant or a negated constant number, else (False, None)."""
+    if isinstance(node, ast.Constant):
+        return True, node.value
+    if (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+            and isinstance(node.operand, ast.Constant) and type(node.operand.value) in (int, float)):
+        return True, -node.operand.value
+    return False, None
+
+
+class Code:
+    """A compiled unit: the top-level program or one function body."""
+
+    __slots__ = ("name", "params", "varnames", "slotmap", "instructions",
+                 "lines", "sources", "ops", "memo", "effect", "reads")
+
+    def __init__(self, name, params=(), varnames=(), memo=None):
+        self.name = name
+        self.params = list(params)
+        self.varnames = list(varnames)
+        self.slotmap = {var: i for i, var in enumerate(self.varnames)}
+        self.instructions = []
+        self.lines = []
+        self.sources = []
+        self.ops = None
+        # Results cached for @memo functions, or None
+        self.memo = memo
+        # For functions: the side effect the body has itself ("produce
+        # output", ...) or None, and the global variables it reads
+        self.effect = None
+        self.reads = ()
+
+    @property
+    def is_function(self):
+        return self.name != "<module>"
+
+    def add_local(self, name):
+        """Slot for name, allocating one if needed."""
+        slot = self.slotmap.get(name)
+        if slot is None:
+            slot = self.slotmap[name] = len(self.varnames)
+            self.varnames.append(name)
+        return slot
+
+    def to_data(self):
+        """Plain tuples of marshal-able values, for pathetic.cache."""
+        instructions = [(op, _arg_data(op, a), b) for op, a, b in self.instructions]
+        return (self.name, self.params, self.varnames, instructions,
+                self.lines, self.sources, self.memo, self.effect, self.reads)
+
+    @classmethod
+    def from_data(cls, data):
+        name, params, varnames, instructions, lines, sources, memo, effect, reads = data
+        code = cls(name, params, varnames, memo)
+        code.effect = effect
+        code.reads = tuple(reads)
+        code.instructions = [(op, _arg_code(op, a), b) for op, a, b in instructions]
+        code.lines = list(lines)
+        code.sources = list(sources)
+        return code
+
+    def calls(self):
+        """(name, instruction index) of each function call the code makes."""
+        for index, (op, a, b) in enumerate(self.instructions):
+            if op == CALL or op == TAIL_CALL:
+                yield a[0], index
+
+    def link(self):
+        """Turn expression code objects into callables; returns self.ops."""
+        if self.ops is None:
+            self.ops = [
+                (op, _link_arg(a), _link_arg(b))
+                for op, a, b in self.instructions
+            ]
+        return self.ops
+
+
+def _arg_data(op, a):
+    """An instruction's a argument with the Code objects in it as data."""
+    if op == MAKE_FUNCTION:
+        return a.to_data()
+    if op == PARALLEL_FOR:
+        return (a[0], a[1].to_data()) + a[2:]
+    return a
+
+
+def _arg_code(op, a):
+    """The inverse of _arg_data."""
+    if op == MAKE_FUNCTION:
+        return Code.from_data(a)
+    if op == PARALLEL_FOR:
+        return (a[0], Code.from_data(a[1])) + tuple(a[2:])
+    return a
+
+
+def _link_arg(arg):
+    if isinstance(arg, types.CodeType):
+        return types.FunctionType(arg, EXPR_GLOBALS)
+    if isinstance(arg, tuple):
+        return tuple(_link_arg(item) for item in arg)
+    return arg
+
+
+def _assigned_names(body, names):
+    """Collect names assigned anywhere in body, not descending into functions."""
+    for stmt in body:
+        kind = type(stmt)
+        if kind in (Let, Assign, LetArray, Get):
+            names.append(stmt.name)
+        elif kind is For:
+            names.append(stmt.var)
+            _assigned_names([stmt.init, stmt.update], names)
+            _assigned_names(stmt.body, names)
+        elif kind is While:
+            _assigned_names(stmt.body, names)
+        elif kind is If:
+            _assigned_names(stmt.body, names)
+            _assigned_names(stmt.orelse or [], names)
+    return names
+
+
+def _has_call(node):
+    return any(isinstance(child, ast.Call) for child in ast.walk(node))
+
+
+def _load(slot):
+    return ast.Subscript(ast.Name("L", ast.Load()), ast.Constant(slot), ast.Load())
+
+
+def _slice(node):
+    """Turn value[a:b:c] into S(value, a, b, c), so that slicing an array
+    gives an array; any other subscript is returned as it is."""
+    if not isinstance(node, ast.Subscript) or not isinstance(node.slice, ast.Slice):
+        return node
+    bounds = [part or ast.Constant(None)
+              for part in (node.slice.lower, node.slice.upper, node.slice.step)]
+    return ast.Call(ast.Name("S", ast.Load()), [node.value, *bounds], [])
+
+
+class _Resolver(ast.NodeTransformer):
+    """Rewrite variable names into slot or dictionary lookups."""
+
+    def __init__(self, compiler):
+        self.compiler = compiler
+
+    def visit_Name(self, node):
+        slot = self.compiler.slots.get(node.id)
+        if slot is None:
+            self.compiler.reads.add(node.id)
+            return ast.Subscript(ast.Name("G", ast.Load()), ast.Constant(node.id), ast.Load())
+        load = _load(slot)
+        if node.id in self.compiler.assigned:
+            return load
+        # Possibly unassigned here: fall back to the global of that name
+        self.compiler.reads.add(node.id)
+        test = ast.Compare(load, [ast.IsNot()], [ast.Name("U", ast.Load())])
+        fallback = ast.Subscript(ast.Name("G", ast.Load()), ast.Constant(node.id), ast.Load())
+        return ast.IfExp(test, load, fallback)
+
+    def visit_Subscript(self, node):
+        return _slice(self.generic_visit(node))
+
+
+class Compiler:
+    def __init__(self, name="<module>", params=(), body=()):
+        if name == "<module>":
+            varnames = []
+        else:
+            varnames = list(params)
+            for var in _assigned_names(body, []):
+                if var not in varnames:
+                    varnames.append(var)
+        self.code = Code(name, params, varnames)
+        self.slots = self.code.slotmap
+        # Names definitely assigned at the current point of compilation
+        self.assigned = set(params)
+        # Temporary slots used by the statement being compiled
+        self.temps = 0
+        # Global variables the compiled code reads
+        self.reads = set()
+
+    # --- Emission ---
+
+    def emit(self, op, a=None, b=None, line=None, source=None):
+        code = self.code
+        code.instructions.append((op, a, b))
+        code.lines.append(line)
+        code.sources.append(source)
+        return len(code.instructions) - 1
+
+    def here(self):
+        return len(self.code.instructions)
+
+    def patch(self, index, a=None, b=None):
+        op, old_a, old_b = self.code.instructions[index]
+        self.code.instructions[index] = (op, old_a if a is None else a, old_b if b is None else b)
+
+    # --- Expressions ---
+
+    def parse_expression(self, expr):
+        try:
+            tree = ast.parse(translate_expression(expr.source), mode="eval")
+        except (SyntaxError, PatheticError):
+            raise PatheticSyntaxError("Invalid expression", expr.line, expr.written) from None
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise PatheticSyntaxError("Unsupported expression", expr.line, expr.written)
+            if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+                raise PatheticSyntaxError("Invalid function call", expr.line, expr.written)
+        return tree
+
+    def constant(self, tree):
+        """Fold an expression without variables; returns (True, value) on success."""
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                return False, None
+            if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Pow, ast.LShift, ast.Mult)):
+                # Only operations whose cost can be told from their operands
+                (left_known, left), (right_known, right) = _literal(node.left), _literal(node.right)
+                if not (left_known and right_known and cheap_operation(node.op, left, right)):
+                    return False, None
+        try:
+            value = eval(compile(tree, "<pathetic>", "eval"), SAFE_GLOBALS, {})
+        except Exception:
+            # Leave it to fail at run time with the usual error
+            return False, None
+        return isinstance(value, _FOLDABLE) and _folded_size_ok(value), value
+
+    def function(self, body, line):
+        """Wrap a resolved expression tree as a code object for a function of (L, G)."""
+        args = ast.arguments(posonlyargs=[], args=[ast.arg("L"), ast.arg("G")],
+                             kwonlyargs=[], kw_defaults=[], defaults=[])
+        module = ast.fix_missing_locations(ast.Expression(ast.Lambda(args, body)))
+        outer = compile(module, f"<pathetic line {line}>", "eval")
+        return next(c for c in outer.co_consts if isinstance(c, types.CodeType))
+
+    def expression(self, expr):
+        """Compile an Expr node to a code object for a function of (L, G).
+
+        Calls inside the expression are emitted first, as CALL instructions
+        that leave their results in temporary slots.
+        """
+        tree = self.parse_expression(expr)
+        return self.function(self.lower(tree.body, expr), expr.line)
+
+    def lower(self, node, expr):
+        """Emit the calls in node and return it with names resolved."""
+        if not _has_call(node):
+            return _Resolver(self).visit(node)
+        if isinstance(node, ast.Call):
+            args = tuple(self.function(self.lower(arg, expr), expr.line) for arg in node.args)
+            slot = self.temp()
+            self.emit(CALL, (node.func.id, args, False), slot, expr.line, expr.written)
+            return _load(slot)
+        if isinstance(node, ast.BoolOp) and any(_has_call(v) for v in node.values[1:]):
+            # Keep short-circuiting: later operands only run when needed
+            slot = self.temp()
+            self.emit(STORE_FAST, slot, self.function(self.lower(node.values[0], expr), expr.line),
+                      expr.line, expr.written)
+            test = _load(slot)
+            if isinstance(node.op, ast.Or):
+                test = ast.UnaryOp(ast.Not(), test)
+            jumps = []
+            for value in node.values[1:]:
+                jumps.append(self.emit(JUMP_IF_FALSE, self.function(test, expr.line), None,
+                                       expr.line, expr.written))
+                self.emit(STORE_FAST, slot, self.function(self.lower(value, expr), expr.line),
+                          expr.line, expr.written)
+            for jump in jumps:
+                self.patch(jump, b=self.here())
+            return _load(slot)
+        if isinstance(node, ast.IfExp) and (_has_call(node.body) or _has_call(node.orelse)):
+            slot = self.temp()
+            jump = self.emit(JUMP_IF_FALSE, self.function(self.lower(node.test, expr), expr.line),
+                             None, expr.line, expr.written)
+            self.emit(STORE_FAST, slot, self.function(self.lower(node.body, expr), expr.line),
+                      expr.line, expr.written)
+            skip = self.emit(JUMP, None, None, expr.line)
+            self.patch(jump, b=self.here())
+            self.emit(STORE_FAST, slot, self.function(self.lower(node.orelse, expr), expr.line),
+                      expr.line, expr.written)
+            self.patch(skip, a=self.here())
+            return _load(slot)
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                setattr(node, field, [self.lower(v, expr) if isinstance(v, ast.AST) else v for v in value])
+            elif isinstance(value, ast.AST):
+                setattr(node, field, self.lower(value, expr))
+        return _slice(node)
+
+    def temp(self):
+        """A fresh temporary slot, reused once the current statement is done."""
+        name = f"${self.temps}"
+        self.temps += 1
+        return self.code.add_local(name)
+
+    # --- Statements ---
+
+    def dest(self, name):
+        slot = self.slots.get(name)
+        return name if slot is None else slot
+
+    def store(self, name, expr, line):
+        tree = self.parse_expression(expr)
+        is_const, value = self.constant(tree)
+        slot = self.slots.get(name)
+        if is_const:
+            op, a, b = (STORE_NAME_CONST, name, value) if slot is None else (STORE_FAST_CONST, slot, value)
+        else:
+            fn = self.expression(expr)
+            op, a, b = (STORE_NAME, name, fn) if slot is None else (STORE_FAST, slot, fn)
+        self.emit(op, a, b, line, expr.written)
+        self.assigned.add(name)
+
+    def call(self, call, dest, line):
+        args = tuple(self.expression(arg) for arg in call.args)
+        source = ", ".join(arg.written for arg in call.args)
+        # Results stored by let/assignment must not be None
+        self.emit(CALL, (call.name, args, dest is not None), dest, line, source)
+
+    def compile_block(self, body):
+        for stmt in body:
+            self.compile_statement(stmt)
+
+    def compile_statement(self, stmt):
+        kind = type(stmt)
+        line = stmt.line
+        self.temps = 0
+
+        if kind is Let or kind is Assign:
+            if type(stmt.value) is Call:
+                self.call(stmt.value, self.dest(stmt.name), line)
+                self.assigned.add(stmt.name)
+            else:
+                self.store(stmt.name, stmt.value, line)
+
+        elif kind is Say:
+            self.emit(SAY, stmt.text, None, line)
+
+        elif kind is SayF:
+            self.fstring(stmt, line)
+
+        elif kind is ExprStmt:
+            self.emit(PRINT, self.expression(stmt.value), None, line, stmt.value.written)
+
+        elif kind is CallStmt:
+            self.call(stmt.call, None, line)
+
+        elif kind is Return:
+            if stmt.value is None:
+                self.emit(RETURN_CONST, None, None, line)
+            else:
+                tree = self.parse_expression(stmt.value)
+                is_const, value = self.constant(tree)
+                if isinstance(tree.body, ast.Call) and tree.body.func.id not in BUILTINS:
+                    # return f(...) reuses the current frame
+                    args = tuple(self.function(self.lower(arg, stmt.value), line)
+                                 for arg in tree.body.args)
+                    self.emit(TAIL_CALL, (tree.body.func.id, args), None, line, stmt.value.written)
+                elif is_const:
+                    self.emit(RETURN_CONST, value, None, line)
+                else:
+                    self.emit(RETURN, self.expression(stmt.value), None, line, stmt.value.written)
+
+        elif kind is If:
+            jump = self.emit(JUMP_IF_FALSE, self.expression(stmt.cond), None, line, stmt.cond.written)
+            before = set(self.assigned)
+            self.compile_block(stmt.body)
+            after_body = self.assigned
+            if stmt.orelse:
+                skip = self.emit(JUMP, None, None, line)
+                self.patch(jump, b=self.here())
+                self.assigned = set(before)
+                self.compile_block(stmt.orelse)
+                self.patch(skip, a=self.here())
+                self.assigned &= after_body
+            else:
+                self.patch(jump, b=self.here())
+                self.assigned = before
+
+        elif kind is While:
+            top = self.here()
+            jump = self.emit(JUMP_IF_FALSE, self.expression(stmt.cond), None, line, stmt.cond.written)
+            before = set(self.assigned)
+            self.compile_block(stmt.body)
+            self.emit(JUMP, top, None, line)
+            self.patch(jump, b=self.here())
+            self.assigned = before
+
+        elif kind is For:
+            counted = self.counted_loop(stmt)
+            if stmt.parallel and counted is None:
+                raise PatheticSyntaxError(
+                    "A parallel for must count its variable to a fixed bound by a constant step",
+                    line, stmt.cond.written)
+            self.compile_statement(stmt.init)
+            if stmt.parallel:
+                self.compile_parallel_loop(stmt, *counted)
+                return
+            if counted is not None:
+                self.compile_counted_loop(stmt, *counted)
+                return
+            top = self.here()
+            jump = self.emit(JUMP_IF_FALSE, self.expression(stmt.cond), None, line, stmt.cond.written)
+            before = set(self.assigned)
+            self.compile_block(stmt.body)
+            self.compile_statement(stmt.update)
+            self.emit(JUMP, top, None, line)
+            self.patch(jump, b=self.here())
+            self.assigned = before
+
+        elif kind is FuncDef:
+            self.emit(MAKE_FUNCTION, compile_function(stmt), None, line)
+
+        elif kind is SetItem:
+            target = self.expression(Expr(stmt.name, line))
+            index = self.expression(stmt.index)
+            value = self.expression(stmt.value)
+            source = f"{stmt.name}[{stmt.index.written}] = {stmt.value.written}"
+            self.emit(STORE_ITEM, target, (index, value), line, source)
+
+        elif kind is LetArray:
+            self.emit(LET_ARRAY, self.dest(stmt.name), (stmt.size, stmt.values), line)
+            self.assigned.add(stmt.name)
+
+        elif kind is Get:
+            self.emit(GET, self.dest(stmt.name), (stmt.name, stmt.size), line)
+            self.assigned.add(stmt.name)
+
+        else:
+            raise PatheticSyntaxError(f"Cannot compile {kind.__name__}", line, "")
+
+
+    def fstring(self, stmt, line):
+        """Emit the SayF stmt as one expression building the whole string.
+
+        The template is split once, here; at run time the literal parts and
+        the values of the {...} expressions are joined in a single step.
+        """
+        template = stmt.template
+        parts = split_fstring(template)
+        if parts is None:
+            raise PatheticSyntaxError("Unclosed '{' in f-string", line, f'f"{stmt.written}"')
+        written = iter(stmt.written_exprs or ())
+        values = []
+        for literal, source in parts:
+            if literal:
+                values.append(ast.Constant(literal))
+            if source is not None:
+                expr = Expr(source.strip(), line, next(written, None))
+                tree = self.parse_expression(expr)
+                text = ast.Call(ast.Name("F", ast.Load()), [self.lower(tree.body, expr)], [])
+                values.append(ast.FormattedValue(text, -1, None))
+        if all(isinstance(value, ast.Constant) for value in values):
+            self.emit(SAY, "".join(value.value for value in values), None, line)
+            return
+        # Errors re-render the template as written to find the {...} that failed
+        self.emit(SAY_F, self.function(ast.JoinedStr(values), line), None, line, stmt.written)
+
+    # --- Counted loops ---
+
+    def counted_loop(self, stmt):
+        """(bound tree, comparison, step) when stmt is a counted for loop, else None.
+
+        The shape is `for i as (i = start; i < bound; i += k)` with any of
+        < <= > >=, a constant step moving toward the bound, and a bound that
+        the body cannot change: it has no calls or indexing, and none of its
+        names (nor the loop variable) are assigned in the body. Functions
+        cannot assign their caller's variables, so calls in the body are fine.
+        """
+        var = stmt.var
+        init, update = stmt.init, stmt.update
+        if type(init) not in (Let, Assign) or init.name != var:
+            return None
+        if type(update) not in (Let, Assign) or update.name != var or type(update.value) is not Expr:
+            return None
+        assigned = _assigned_names(stmt.body, [])
+        if var in assigned:
+            return None
+
+        cond = self.parse_expression(stmt.cond).body
+        if (not isinstance(cond, ast.Compare) or len(cond.ops) != 1
+                or type(cond.ops[0]) not in _LOOP_COMPARISONS
+                or not isinstance(cond.left, ast.Name) or cond.left.id != var):
+            return None
+        bound = cond.comparators[0]
+        for node in ast.walk(bound):
+            if isinstance(node, (ast.Call, ast.Subscript)):
+                return None
+            if isinstance(node, ast.Name) and (node.id == var or node.id in assigned):
+                return None
+
+        step = self.parse_expression(update.value).body
+        if not isinstance(step, ast.BinOp) or type(step.op) not in (ast.Add, ast.Sub):
+            return None
+        if not isinstance(step.left, ast.Name) or step.left.id != var:
+            return None
+        is_const, amount = self.constant(ast.Expression(step.right))
+        if not is_const or type(amount) is not int or amount == 0:
+            return None
+        if isinstance(step.op, ast.Sub):
+            amount = -amount
+
+        comparison = _LOOP_COMPARISONS[type(cond.ops[0])]
+        if (amount > 0) != (comparison in ("<", "<=")):
+            return None
+        return bound, comparison, amount
+
+    def compile_counted_loop(self, stmt, bound, comparison, step):
+        line = stmt.line
+        dest = self.dest(stmt.var)
+        iterator = self.code.add_local(f"$for{self.here()}")
+        end = self.code.add_local(f"$end{self.here()}")
+        bound = self.function(_Resolver(self).visit(bound), line)
+        self.emit(FOR_RANGE, (dest, iterator, end), (bound, comparison, step), line, stmt.cond.written)
+        top = self.emit(FOR_NEXT, None, dest, line)
+        before = set(self.assigned)
+        self.compile_block(stmt.body)
+        self.emit(JUMP, top, None, line)
+        self.patch(top, a=(iterator, end, self.here()))
+        self.assigned = before
+
+    def compile_parallel_loop(self, stmt, bound, comparison, step):
+        """A PARALLEL_FOR followed by the same loop compiled as usual, for
+        runs that are not worth spreading over workers."""
+        check = _ParallelCheck(self, stmt)
+        private = sorted(check.private)
+        kernel = compile_kernel(stmt, step, private)
+        info = (self.dest(stmt.var), kernel, tuple(sorted(check.free)), tuple(sorted(check.written)),
+                tuple((name, self.dest(name)) for name in private), tuple(sorted(check.calls)))
+        bound_fn = self.function(_Resolver(self).visit(copy.deepcopy(bound)), stmt.line)
+        start = self.emit(PARALLEL_FOR, info, None, stmt.line, stmt.cond.written)
+        self.compile_counted_loop(stmt, bound, comparison, step)
+        self.patch(start, b=(bound_fn, comparison, step, self.here()))
+
+
+class _ParallelCheck:
+    """Proves that the iterations of a parallel for are independent.
+
+    An iteration may only differ from the others in the loop variable, in
+    its private variables (names the body sets before it reads them) and in
+    the elements it writes, which must be array[var] of arrays that are not
+    otherwise read. Anything an iteration could observe from another one --
+    output, input, user function calls, a variable carried over between
+    iterations -- is a syntax error. Fills in free (names read from outside
+    the loop, including the written arrays), written, private and calls
+    (the built-ins used).
+    """
+
+    def __init__(self, compiler, stmt):
+        self.compiler = compiler
+        self.var = stmt.var
+        self.private = set(_assigned_names(stmt.body, []))
+        self.written = set()
+        self.free = set()
+        self.calls = set()
+        self.find_writes(stmt.body)
+        defined = set()
+        self.block(stmt.body, defined)
+        for name in sorted(self.private - defined):
+            self.fail(f"'{name}' is only set in some iterations of a parallel for", stmt.line, name)
+
+    def fail(self, message, line, text):
+        raise PatheticSyntaxError(message, line, text)
+
+    def find_writes(self, body):
+        for stmt in body:
+            kind = type(stmt)
+            if kind is SetItem:
+                self.written.add(stmt.name)
+            elif kind is For:
+                self.find_writes(stmt.body)
+            elif kind is While:
+                self.find_writes(stmt.body)
+            elif kind is If:
+                self.find_writes(stmt.body)
+                self.find_writes(stmt.orelse or [])
+
+    def block(self, body, defined):
+        for stmt in body:
+            self.statement(stmt, defined)
+
+    def statement(self, stmt, defined):
+        kind = type(stmt)
+        line = stmt.line
+        if kind is Let or kind is Assign:
+            if stmt.name in self.written:
+                self.fail(f"Array '{stmt.name}' is written by a parallel for and cannot be reassigned",
+                          line, stmt.name)
+            if type(stmt.value) is Call:
+                self.builtin(stmt.value.name, line)
+                for arg in stmt.value.args:
+                    self.read(arg, defined)
+            else:
+                self.read(stmt.value, defined)
+            defined.add(stmt.name)
+        elif kind is SetItem:
+            source = f"{stmt.name}[{stmt.index.written}] = {stmt.value.written}"
+            if stmt.name in self.private:
+                self.fail(f"Array '{stmt.name}' is written by a parallel for and cannot be reassigned",
+                          line, source)
+            index = self.compiler.parse_expression(stmt.index).body
+            if not isinstance(index, ast.Name) or index.id != self.var:
+                self.fail(f"A parallel for may only write '{stmt.name}[{self.var}]'", line, source)
+            self.free.add(stmt.name)
+            self.read(stmt.value, defined)
+        elif kind is If:
+            self.read(stmt.cond, defined)
+            in_body = set(defined)
+            self.block(stmt.body, in_body)
+            in_orelse = set(defined)
+            self.block(stmt.orelse or [], in_orelse)
+            defined |= in_body & in_orelse
+        elif kind is While:
+            self.read(stmt.cond, defined)
+            self.block(stmt.body, set(defined))
+        elif kind is For:
+            self.statement(stmt.init, defined)
+            inner = set(defined)
+            self.read(stmt.cond, inner)
+            self.block(stmt.body, inner)
+            self.statement(stmt.update, inner)
+        elif kind is CallStmt:
+            self.builtin(stmt.call.name, line)
+        else:
+            text = {Say: "say", SayF: "say", Get: "get", Return: "return", FuncDef: "func",
+                    LetArray: "let name[size]"}.get(kind)
+            if kind is ExprStmt:
+                text = stmt.value.written
+            self.fail("Statement is not allowed in a parallel for", line, text)
+
+    def builtin(self, name, line):
+        if name not in BUILTINS:
+            # User functions may say, get or change arrays
+            self.fail(f"A parallel for cannot call function '{name}'", line, f"{name}(...)")
+        self.calls.add(name)
+
+    def read(self, expr, defined):
+        tree = self.compiler.parse_expression(expr)
+        functions, indexed = set(), set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                self.builtin(node.func.id, expr.line)
+                functions.add(id(node.func))
+            elif (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+                  and isinstance(node.slice, ast.Name) and node.slice.id == self.var):
+                indexed.add(id(node.value))
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Name) or node.id == self.var or id(node) in functions:
+                continue
+            name = node.id
+            if name in self.written and id(node) not in indexed:
+                self.fail(f"A parallel for that writes '{name}' may only read '{name}[{self.var}]'",
+                          expr.line, expr.written)
+            if name in self.private:
+                if name not in defined:
+                    self.fail(f"'{name}' is read before it is set, so one iteration of a parallel for "
+                              f"would depend on another", expr.line, expr.written)
+            else:
+                self.free.add(name)
+
+
+def compile_function(func):
+    compiler = Compiler(func.name, func.params, func.body)
+    effect = _side_effect(func)
+    if func.memo is not None:
+        if effect is not None:
+            what, line, text = effect
+            raise PatheticSyntaxError(f"Memoized function '{func.name}' cannot {what}", line, text)
+        compiler.code.memo = func.memo
+    compiler.compile_block(func.body)
+    compiler.emit(RETURN_CONST, None, None, func.line)
+    compiler.code.effect = effect and effect[0]
+    compiler.code.reads = tuple(sorted(compiler.reads))
+    return compiler.code
+
+
+def _side_effect(func):
+    """(what, line, text) for the first thing func does besides computing
+    a result, or None.
+
+    That is producing output, reading input, defining functions or writing
+    to arrays other than ones it creates itself: a cached call to an @memo
+    function does not run at all, so it, and every function it calls, must
+    do none of these.
+    """
+    assigned = _assigned_names(func.body, list(func.params))
+    # Arrays the function creates and never replaces
+    own = {stmt.name for stmt in _statements(func.body) if type(stmt) is LetArray}
+    own = {name for name in own if assigned.count(name) == 1}
+
+    for stmt in _statements(func.body):
+        kind = type(stmt)
+        if kind is Say or kind is SayF or kind is ExprStmt:
+            return "produce output", stmt.line, "say" if kind is not ExprStmt else stmt.value.written
+        if kind is Get:
+            return "read input", stmt.line, f"get({stmt.name})"
+        if kind is FuncDef:
+            return "define functions", stmt.line, f"func {stmt.name}"
+        if kind is SetItem and stmt.name not in own:
+            return (f"write to '{stmt.name}', an array it did not create", stmt.line,
+                    f"{stmt.name}[{stmt.index.written}] = {stmt.value.written}")
+    return None
+
+
+def reachable(code, functions):
+    """code and every function it can call, directly or not.
+
+    functions maps names to the Codes a call to that name may run; names
+    it does not have are built-ins (or not defined at all).
+    """
+    seen = {id(code)}
+    stack = [code]
+    while stack:
+        current = stack.pop()
+        yield current
+        for name, _ in current.calls():
+            for callee in functions.get(name, ()):
+                if id(callee) not in seen:
+                    seen.add(id(callee))
+                    stack.append(callee)
+
+
+def _functions(code):
+    """The Codes of every function code defines, at any depth."""
+    for op, a, _ in code.instructions:
+        if op == MAKE_FUNCTION:
+            yield a
+            yield from _functions(a)
+
+
+def _check_memo_calls(program):
+    """Reject @memo functions that call a function of the program with a
+    side effect (see _side_effect); the VM checks again, at run time, for
+    functions defined elsewhere."""
+    functions = {}
+    for func in _functions(program):
+        functions.setdefault(func.name, []).append(func)
+    for defined in functions.values():
+        for func in defined:
+            if func.memo is None:
+                continue
+            for name, index in func.calls():
+                for callee in functions.get(name, ()):
+                    effect = next((c.effect for c in reachable(callee, functions) if c.effect), None)
+                    if effect is not None:
+                        raise PatheticSyntaxError(
+                            f"Memoized function '{func.name}' cannot call '{name}', which can {effect}",
+                            func.lines[index], f"{name}(...)")
+
+
+def _statements(body):
+    """Every statement in body, including those in nested blocks."""
+    for stmt in body:
+        yield stmt
+        kind = type(stmt)
+        if kind is If:
+            yield from _statements(stmt.body)
+            yield from _statements(stmt.orelse or [])
+        elif kind is While or kind is For:
+            yield from _statements(stmt.body)
+        if kind is For:
+            yield stmt.init
+            yield stmt.update
+
+
+def compile_kernel(stmt, step, private):
+    """The body of a parallel for as a function of (var, "$stop"): it runs
+    the loop from var up to (or down to) $stop and returns the values of
+    the private names afterwards."""
+    compiler = Compiler("<parallel for>", (stmt.var, "$stop"), stmt.body)
+    compiler.compile_counted_loop(stmt, ast.Name("$stop", ast.Load()), "<" if step > 0 else ">", step)
+    state = ast.Tuple([ast.Name(name, ast.Load()) for name in private], ast.Load())
+    compiler.emit(RETURN, compiler.function(_Resolver(compiler).visit(state), stmt.line), None, stmt.line,
+                  ", ".join(private))
+    return compiler.code
+
+
+def compile_program(program):
+    compiler = Compiler()
+    compiler.compile_block(program.body)
+    compiler.emit(RETURN_CONST, None, None, None)
+    _check_memo_calls(compiler.code)
+    return compiler.code
+
+
+def compile_source(source, opt_level=None):
+    """Parse, optimize and compile Pathetic source text into a Code object.
+
+    opt_level is a pathetic.optimizer level; None means the default.
+    """
+    # Imported here: the optimizer uses this module's helpers
+    from .optimizer import DEFAULT_OPT_LEVEL, optimize
+
+    program = parse(source)
+    return compile_program(optimize(program, DEFAULT_OPT_LEVEL if opt_level is None else opt_level))
+
+
+def disassemble(code, indent=""):
+    """Human-readable listing of a Code object, for debugging."""
+    memo = "" if code.memo is None else f" memo={code.memo}"
+    out = [f"{indent}{code.name} params={code.params} varnames={code.varnames}{memo}"]
+    for index, (op, a, b) in enumerate(code.instructions):
+        line = code.lines[index]
+        args = []
+        for arg in (a, b):
+            if isinstance(arg, types.CodeType):
+                args.append(f"<{code.sources[index]}>")
+            elif isinstance(arg, Code):
+                args.append(f"<func {arg.name}>")
+            elif op == PARALLEL_FOR and arg is a:
+                args.append(repr((a[0], "<kernel>") + a[2:]))
+            elif arg is not None:
+                args.append(repr(arg))
+        out.append(f"{indent}  {index:4d} {'' if line is None else line:>5} {OPNAMES[op]:<17} {' '.join(args)}")
+        if op == MAKE_FUNCTION:
+            out.append(disassemble(a, indent + "    "))
+        elif op == PARALLEL_FOR:
+            out.append(disassemble(a[1], indent + "    "))
+    return "\n".join(out)
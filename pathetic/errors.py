@@ -0,0 +1,31 @@
+# pathetic/errors.py
+
+class PatheticError(Exception):
+    """Base class for errors raised while running a Pathetic program."""
+
+
+class PatheticSyntaxError(PatheticError):
+    """Raised by the lexer and parser for malformed source."""
+
+    def __init__(self, message, lineno=None, text=None):
+        self.message = message
+        self.lineno = lineno
+        self.text = text
+        super().__init__(self.format())
+
+    def format(self):
+        if self.lineno is None:
+            return f"Syntax error: {self.message}"
+        return f"Syntax error: {self.message} at line {self.lineno}: {self.text}"
+
+
+class PatheticRuntimeError(PatheticError):
+    """Raised for errors detected while executing a program.
+
+    The message is printed verbatim, so it carries its own prefix
+    ("Evaluation error: ...", "Input error: ...").
+    """
+
+
+class LimitExceeded(PatheticRuntimeError):
+    """Raised when a run uses up one of its pathetic.limits.Limits."""
@@ -0,0 +1,108 @@
+# pathetic/expressions.py
+
+from functools import lru_cache
+
+from .arrays import BUILTINS
+from .errors import PatheticRuntimeError
+from .lexer import tokenize_line
+from .values import format_value, process_escape_sequences
+
+# Expressions only see the program's variables plus these names; Python
+# builtins are not reachable.
+SAFE_GLOBALS = {
+    "__builtins__": {},
+    "True": True,
+    "False": False,
+}
+SAFE_GLOBALS.update((name, entry[0]) for name, entry in BUILTINS.items())
+
+# Pathetic spellings of Python operators.
+OPERATOR_ALIASES = {"|": "%", "^": "**"}
+
+
+def translate_expression(expr):
+    """Rewrite Pathetic expression text as Python expression text."""
+    tokens = tokenize_line(expr)
+    parts = []
+    pos = 0
+    for token in tokens:
+        if token.kind == "OP" and token.value == ".":
+            raise PatheticRuntimeError(f"Evaluation error: attribute access is not allowed in expression '{expr}'")
+        if token.kind == "OP" and token.value == "@":
+            raise PatheticRuntimeError(f"Evaluation error: invalid character '@' in expression '{expr}'")
+        if token.kind == "NAME" and token.value.startswith("__"):
+            raise PatheticRuntimeError(f"Evaluation error: invalid name '{token.value}' in expression '{expr}'")
+        if token.kind == "OP" and token.value in OPERATOR_ALIASES:
+            parts.append(expr[pos:token.col])
+            parts.append(OPERATOR_ALIASES[token.value])
+            pos = token.end
+    parts.append(expr[pos:])
+    return "".join(parts).strip()
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(expr):
+    """Compile expression text once; variables are looked up at run time."""
+    return compile(translate_expression(expr), "<pathetic>", "eval")
+
+
+def evaluation_error(error, expr, local_vars):
+    """Build the 'Evaluation error: ...' message for a failed evaluation."""
+    if isinstance(error, PatheticRuntimeError):
+        return str(error)
+    if not isinstance(error, SyntaxError):
+        try:
+            names = compile_expression(expr).co_names
+        except Exception:
+            names = ()
+        # A variable bound to None (e.g. an empty function result) reads as undefined
+        for name in names:
+            if name in local_vars and local_vars[name] is None:
+                return f"Evaluation error: Variable '{name}' is undefined"
+    return f"Evaluation error: {str(error)} in expression '{expr}'"
+
+
+def evaluate(expr, local_vars):
+    """Evaluate expression text; returns an error string on failure."""
+    expr = expr.strip()
+    try:
+        return eval(compile_expression(expr), SAFE_GLOBALS, local_vars)
+    except Exception as e:
+        return evaluation_error(e, expr, local_vars)
+
+
+@lru_cache(maxsize=1024)
+def split_fstring(content):
+    """Split an f-string body into (literal, expression) pairs.
+
+    Escapes are processed first. The last pair's expression is None; the
+    result is None when a '{' is never closed.
+    """
+    content = process_escape_sequences(content)
+    parts = []
+    pos = 0
+    while True:
+        start = content.find("{", pos)
+        if start == -1:
+            parts.append((content[pos:], None))
+            return tuple(parts)
+        end = content.find("}", start + 1)
+        if end == -1:
+            return None
+        parts.append((content[pos:start], content[start + 1:end]))
+        pos = end + 1
+
+
+def render_fstring(content, local_vars):
+    parts = split_fstring(content)
+    if parts is None:
+        return "Formatting error: Unclosed '{'"
+    result = []
+    for literal, expr in parts:
+        result.append(literal)
+        if expr is not None:
+            evaluated = evaluate(expr, local_vars)
+            if isinstance(evaluated, str) and evaluated.startswith("Evaluation error"):
+                return f"Formatting error: {evaluated}"
+            result.append(format_value(evaluated if evaluated is not None else ""))
+    return "".join(result)
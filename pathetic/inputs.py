@@ -0,0 +1,118 @@
+# pathetic/inputs.py
+#
+# Where `get` reads from. By default the VM prompts and reads a line per
+# get, as it always has. A TokenReader instead serves whitespace-separated
+# tokens from a file or stream, read in large chunks: get(x) takes the next
+# token and get(arr[n]) the next n, however they are split across lines.
+# Files are memory-mapped, and a run of plain numbers goes straight into a
+# typed array without parsing each value separately.
+
+import mmap
+import re
+
+from .arrays import FLOAT, INT, Array, make_array
+from .errors import PatheticRuntimeError
+from .values import parse_value
+
+# Bytes read from the source at a time.
+CHUNK_SIZE = 1 << 20
+
+# A run of tokens joined by single spaces that are all integers, or all
+# integers and decimals; anything else goes through parse_value.
+_INTEGERS = re.compile(rb"-?[0-9]+(?: -?[0-9]+)*")
+_NUMBERS = re.compile(rb"-?[0-9]+(?:\.[0-9]+)?(?: -?[0-9]+(?:\.[0-9]+)?)*")
+
+
+def parse_tokens(tokens, size):
+    """The array get(name[size]) stores for these byte-string tokens."""
+    joined = b" ".join(tokens)
+    try:
+        if _INTEGERS.fullmatch(joined):
+            return Array(INT, map(int, tokens))
+        if _NUMBERS.fullmatch(joined):
+            return Array(FLOAT, map(float, tokens))
+    except OverflowError:
+        pass
+    return make_array([parse_value(token.decode("utf-8", "replace")) for token in tokens], size)
+
+
+class TokenReader:
+    """Non-interactive input: whitespace-separated tokens, no prompts.
+
+    source is anything with read(size) returning bytes or str: a binary
+    file, sys.stdin.buffer, an io.StringIO, an mmap. Buffered streams are
+    read with read1, so a pipe or terminal hands over what it has instead
+    of blocking until a whole chunk arrives.
+    """
+
+    def __init__(self, source, closing=()):
+        self.source = source
+        self.read = getattr(source, "read1", source.read)
+        # Objects to close along with the reader
+        self.closing = closing
+        self.tokens = []
+        self.index = 0
+        # Unfinished token at the end of the last chunk
+        self.partial = b""
+        self.eof = False
+
+    @classmethod
+    def open(cls, path):
+        """Read tokens from the file at path, memory-mapped when possible."""
+        file = open(path, "rb")
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files and special files cannot be mapped
+            return cls(file, (file,))
+        return cls(mapped, (mapped, file))
+
+    def close(self):
+        for item in self.closing:
+            item.close()
+
+    def fill(self):
+        """Read one more chunk; returns False at end of input."""
+        if self.eof:
+            return False
+        data = self.read(CHUNK_SIZE)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if self.index:
+            del self.tokens[:self.index]
+            self.index = 0
+        if not data:
+            self.eof = True
+            if self.partial:
+                self.tokens.append(self.partial)
+                self.partial = b""
+                return True
+            return False
+        data = self.partial + data
+        tokens = data.split()
+        self.partial = b""
+        if tokens and not data[-1:].isspace():
+            self.partial = tokens.pop()
+        self.tokens.extend(tokens)
+        return True
+
+    def take(self, count):
+        """Up to count tokens; fewer only when the input runs out."""
+        while len(self.tokens) - self.index < count and self.fill():
+            pass
+        tokens = self.tokens[self.index:self.index + count]
+        self.index += len(tokens)
+        return tokens
+
+    def read_value(self, name, line):
+        tokens = self.take(1)
+        if not tokens:
+            raise PatheticRuntimeError(f"Input error: No input left for {name} at line {line}")
+        return parse_value(tokens[0].decode("utf-8", "replace"))
+
+    def read_values(self, name, size, line):
+        tokens = self.take(size)
+        if len(tokens) < size:
+            raise PatheticRuntimeError(
+                f"Input error: Expected {size} values, got {len(tokens)} at line {line}")
+        return parse_tokens(tokens, size)
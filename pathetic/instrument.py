@@ -0,0 +1,223 @@
+# pathetic/instrument.py
+#
+# Hooks for observing a running program from Python.
+#
+# The VM talks to at most one tracer, and only when one is installed; with
+# none, the cost is a local `is not None` test per instruction. A tracer
+# gets low-level events, which pathetic.profiler.Profiler uses directly:
+#
+#     start(frame)                 the program starts in frame
+#     step(frame, index)           frame is about to run instruction index
+#     call(callee, frame, index)   the CALL at frame's instruction index entered callee
+#     tail_call(callee)            the running frame was replaced by callee
+#     ret(value)                   the running frame is returning value
+#     say(text)                    output was produced
+#     get(name, value)             input was read into name
+#     memo(name, hit)              a call to @memo function name was (hit) or was
+#                                  not answered from its cache
+#     stop()                       the program ended, normally or not
+#
+# Instrumentation turns these into the events embedders want, in the same
+# spirit as Python's sys.settrace: a statement event whenever execution
+# reaches a new line (or the same line again through a loop), a loop event
+# each time a loop's body starts a pass, function entry and exit, and I/O.
+
+from .compiler import FOR_NEXT, JUMP, JUMP_IF_FALSE
+
+
+class Instrumentation:
+    """Execution hooks; subclass it and override the on_* events you need.
+
+    Frames are pathetic.vm.Frame objects: frame.code.name is the function
+    ("<module>" for the program) and frame[name] reads a visible variable.
+    """
+
+    def on_statement(self, frame, line):
+        """Execution reached line."""
+
+    def on_loop(self, frame, line):
+        """The body of the loop whose header is on line is starting a pass,
+        the first one included. The test that ends the loop is not one."""
+
+    def on_call(self, frame):
+        """A function, or the program, was entered; its arguments are set."""
+
+    def on_return(self, frame, value):
+        """frame is returning value."""
+
+    def on_say(self, frame, text):
+        """frame produced output text."""
+
+    def on_get(self, frame, name, value):
+        """frame read value into name."""
+
+    # --- Tracer protocol, used by the VM ---
+
+    def start(self, frame):
+        # Callers' (frame, index, line), innermost last
+        self._stack = []
+        self._frame = frame
+        self._index = -1
+        self._line = None
+        # code -> {index of a loop body's first instruction: the loop's line}
+        self._bodies = {}
+        self.on_call(frame)
+
+    def step(self, frame, index):
+        code = frame.code
+        instructions = code.instructions
+        if (index and index - 1 == self._index
+                and instructions[index - 1][0] in (JUMP_IF_FALSE, FOR_NEXT)):
+            # Past a test: if it is a loop's, the loop's body is starting
+            line = self.loop_bodies(code).get(index)
+            if line is not None:
+                self.on_loop(frame, line)
+        if instructions[index][0] == JUMP:
+            # Only moves to the loop header or past a branch
+            return
+        line = code.lines[index]
+        if index <= self._index:
+            # A backward jump to a loop header, which now tests whether to go round again
+            self._index = index
+            self._line = line
+            if line is not None:
+                self.on_statement(frame, line)
+            return
+        self._index = index
+        if line != self._line:
+            self._line = line
+            if line is not None:
+                self.on_statement(frame, line)
+
+    def loop_bodies(self, code):
+        """The first instruction of each loop body in code, mapped to the
+        line of the loop's header."""
+        bodies = self._bodies.get(code)
+        if bodies is None:
+            bodies = self._bodies[code] = {}
+            instructions = code.instructions
+            for end, (op, header, _) in enumerate(instructions, 1):
+                if op != JUMP or header is None or header >= end:
+                    continue
+                # The loop ends with this jump back to its header, and its test jumps past it
+                for i in range(header, end):
+                    op, a, b = instructions[i]
+                    if op == JUMP_IF_FALSE and b == end or op == FOR_NEXT and a[2] == end:
+                        if code.lines[header] is not None:
+                            bodies[i + 1] = code.lines[header]
+                        break
+        return bodies
+
+    def call(self, callee, frame, index):
+        self._stack.append((self._frame, self._index, self._line))
+        self._frame = callee
+        self._index = -1
+        self._line = None
+        self.on_call(callee)
+
+    def tail_call(self, callee):
+        self.on_return(self._frame, None)
+        self._frame = callee
+        self._index = -1
+        self._line = None
+        self.on_call(callee)
+
+    def ret(self, value):
+        self.on_return(self._frame, value)
+        if self._stack:
+            self._frame, self._index, self._line = self._stack.pop()
+
+    def say(self, text):
+        self.on_say(self._frame, text)
+
+    def get(self, name, value):
+        self.on_get(self._frame, name, value)
+
+    def memo(self, name, hit):
+        pass
+
+    def stop(self):
+        self._stack = []
+
+
+class CallbackInstrumentation(Instrumentation):
+    """Instrumentation that sends every event to callback(event, frame, arg).
+
+    event is "statement" or "loop" (arg: the line), "call" (arg: None),
+    "return" (arg: the value), "say" (arg: the text) or "get" (arg: a
+    (name, value) pair).
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def on_statement(self, frame, line):
+        self.callback("statement", frame, line)
+
+    def on_loop(self, frame, line):
+        self.callback("loop", frame, line)
+
+    def on_call(self, frame):
+        self.callback("call", frame, None)
+
+    def on_return(self, frame, value):
+        self.callback("return", frame, value)
+
+    def on_say(self, frame, text):
+        self.callback("say", frame, text)
+
+    def on_get(self, frame, name, value):
+        self.callback("get", frame, (name, value))
+
+
+class Tracers:
+    """Several tracers behind one, e.g. a profiler and instrumentation."""
+
+    def __init__(self, tracers):
+        self.tracers = tracers
+
+    def start(self, frame):
+        for tracer in self.tracers:
+            tracer.start(frame)
+
+    def step(self, frame, index):
+        for tracer in self.tracers:
+            tracer.step(frame, index)
+
+    def call(self, callee, frame, index):
+        for tracer in self.tracers:
+            tracer.call(callee, frame, index)
+
+    def tail_call(self, callee):
+        for tracer in self.tracers:
+            tracer.tail_call(callee)
+
+    def ret(self, value):
+        for tracer in self.tracers:
+            tracer.ret(value)
+
+    def say(self, text):
+        for tracer in self.tracers:
+            tracer.say(text)
+
+    def get(self, name, value):
+        for tracer in self.tracers:
+            tracer.get(name, value)
+
+    def memo(self, name, hit):
+        for tracer in self.tracers:
+            tracer.memo(name, hit)
+
+    def stop(self):
+        for tracer in self.tracers:
+            tracer.stop()
+
+
+def combine(*tracers):
+    """One tracer for the ones given that are not None, or None."""
+    tracers = [tracer for tracer in tracers if tracer is not None]
+    if not tracers:
+        return None
+    if len(tracers) == 1:
+        return tracers[0]
+    return Tracers(tracers)
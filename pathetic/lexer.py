@@ -0,0 +1,59 @@
+# pathetic/lexer.py
+
+import re
+from collections import namedtuple
+
+from .errors import PatheticSyntaxError
+
+# A token remembers where it came from so the parser can slice expression
+# text straight out of the source line and report accurate line numbers.
+Token = namedtuple("Token", ["kind", "value", "line", "col", "end"])
+
+# A non-blank source line together with its tokens.
+Line = namedtuple("Line", ["lineno", "text", "tokens"])
+
+# Whitespace between tokens is skipped by finditer; any other character no
+# token starts with is caught by ERROR, so no input is silently dropped.
+_TOKEN_RE = re.compile(r"""
+    (?P<COMMENT>//.*)
+  | (?P<FSTRING>f"(?:[^"\\]|\\.)*"|f'(?:[^'\\]|\\.)*')
+  | (?P<STRING>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<NUMBER>\d+\.\d+|\d+)
+  | (?P<NAME>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<OP>\+\+|--|\*\*|==|!=|<=|>=|\+=|-=|\*=|/=|[-+*/%|^<>=!(),;\[\]{}.:@])
+  | (?P<QUOTE>["'])
+  | (?P<ERROR>[^ \t\r\f\v])
+""", re.VERBOSE)
+
+_new_token = tuple.__new__
+
+
+def tokenize_line(text, lineno=1):
+    """Split a single source line into tokens, dropping whitespace and comments."""
+    tokens = []
+    append = tokens.append
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == "COMMENT":
+            break
+        if kind == "ERROR":
+            raise PatheticSyntaxError(f"Unexpected character '{match.group()}'", lineno, text.strip())
+        if kind == "QUOTE":
+            raise PatheticSyntaxError("Unterminated string literal", lineno, text.strip())
+        start, end = match.span()
+        append(_new_token(Token, (kind, match.group(), lineno, start, end)))
+    return tokens
+
+
+def tokenize(source):
+    """Tokenize a whole program into a list of Line tuples.
+
+    Blank and comment-only lines are skipped; line numbers are 1-based and
+    refer to the original source.
+    """
+    lines = []
+    for lineno, text in enumerate(source.splitlines(), 1):
+        tokens = tokenize_line(text, lineno)
+        if tokens:
+            lines.append(Line(lineno, text, tokens))
+    return lines
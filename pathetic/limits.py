@@ -0,0 +1,202 @@
+# pathetic/limits.py
+#
+# Resource budgets for untrusted programs.
+#
+# Straight-line code always finishes; only loops and calls can make a
+# program run for long. So the VM does no limit work per instruction: it
+# counts a step each time a loop goes round (a backward jump) and each time
+# a function is called, and only with limits set. Every CHECK_INTERVAL
+# steps it checks the step count and the clock, and adds up the string and
+# array data held in variables when memory is limited: the globals and the
+# locals of every frame on the call stack, each value counted once. With
+# little headroom left, memory is checked more often, so that even a value
+# that quadruples every step is caught in time. Array sizes are checked
+# before `let` and `get` create arrays. A string or array stored in a
+# variable (made by `"x" * n`, `s + s`, ...) uses up the headroom left at
+# the last check, and memory is checked as soon as that runs out.
+# Exceeding any budget stops the program with LimitExceeded.
+
+import time
+
+from .arrays import Array, ObjectArray
+from .errors import LimitExceeded
+
+# Most steps between checks
+CHECK_INTERVAL = 64
+
+
+def value_size(value):
+    """Approximate bytes held by a value: its array or string data."""
+    kind = type(value)
+    if kind is Array:
+        return len(value) * value.itemsize
+    if kind is str:
+        return len(value)
+    if kind is ObjectArray or kind is list:
+        return len(value) * 8 + sum(len(item) for item in value if type(item) is str)
+    return 0
+
+
+class Limits:
+    """Budgets for one run; None means unlimited.
+
+    max_steps: loop iterations plus function calls.
+    time_limit: seconds of wall-clock time.
+    max_memory: approximate bytes of string and array data held in
+    variables (global and those of every function on the call stack).
+    max_array: elements in any one array.
+    """
+
+    __slots__ = ("max_steps", "time_limit", "max_memory", "max_array")
+
+    def __init__(self, max_steps=None, time_limit=None, max_memory=None, max_array=None):
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        self.max_memory = max_memory
+        self.max_array = max_array
+
+    def __reduce__(self):
+        # Picklable for process pools despite __slots__
+        return (Limits, (self.max_steps, self.time_limit, self.max_memory, self.max_array))
+
+    def tighten(self, other):
+        """Limits no looser than either self or other."""
+        if other is None:
+            return self
+
+        def least(mine, theirs):
+            if mine is None:
+                return theirs
+            if theirs is None:
+                return mine
+            return min(mine, theirs)
+
+        return Limits(least(self.max_steps, other.max_steps),
+                      least(self.time_limit, other.time_limit),
+                      least(self.max_memory, other.max_memory),
+                      least(self.max_array, other.max_array))
+
+    def start(self):
+        """A fresh Budget counting against these limits from now."""
+        return Budget(self)
+
+
+class Budget:
+    """What is left of the limits during one run; created by Limits.start.
+
+    The VM counts steps down locally and calls refill when it reaches zero,
+    which checks the limits and says how many steps to run until the next
+    check.
+    """
+
+    __slots__ = ("limits", "steps", "interval", "deadline", "headroom",
+                 "frames", "owners", "stack_bytes")
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.steps = 0
+        # Steps until the next check
+        self.interval = 1
+        self.deadline = None if limits.time_limit is None else time.monotonic() + limits.time_limit
+        # Bytes of memory left at the last check
+        self.headroom = float("inf") if limits.max_memory is None else limits.max_memory
+        # The bottom of the call stack as last added up: (frame, ids of its
+        # sized values) each; how many of those frames hold each id, and
+        # that value's size; and the bytes they hold together
+        self.frames = []
+        self.owners = {}
+        self.stack_bytes = 0
+
+    def refill(self, L, G, stack, line):
+        """The steps since the last check are done, the last at line; check
+        the limits. stack holds the frames of the callers of the running
+        one."""
+        self.steps += self.interval
+        limits = self.limits
+        interval = CHECK_INTERVAL
+        if limits.max_steps is not None:
+            if self.steps > limits.max_steps:
+                raise LimitExceeded(f"Limit exceeded: More than {limits.max_steps} steps at line {line}")
+            interval = min(interval, limits.max_steps + 1 - self.steps)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise LimitExceeded(
+                f"Limit exceeded: Ran longer than {limits.time_limit:g} seconds at line {line}")
+        if limits.max_memory is not None:
+            used = self.check_memory(L, G, stack, line)
+            # Soon enough to catch a value that quadruples every step
+            interval = min(interval, max(1, (limits.max_memory // max(used, 1)).bit_length() // 2))
+        self.interval = interval
+        return interval
+
+    def check_memory(self, L, G, stack, line):
+        """Add up the memory held by variables now; returns the bytes used.
+
+        A caller waiting on the stack cannot change its variables, so each
+        frame is added up once, by the first check to find it on the stack,
+        and taken off by the first check to find it gone.
+        """
+        frames, owners = self.frames, self.owners
+        # Frames popped since the last check were replaced by new objects,
+        # so the stack still matches up to some point; bisect for it
+        low, high = 0, min(len(frames), len(stack))
+        while low < high:
+            middle = (low + high) // 2
+            if stack[middle] is frames[middle][0]:
+                low = middle + 1
+            else:
+                high = middle
+        while len(frames) > low:
+            for key in frames.pop()[1]:
+                entry = owners[key]
+                entry[0] -= 1
+                if not entry[0]:
+                    del owners[key]
+                    self.stack_bytes -= entry[1]
+        for frame in stack[low:]:
+            keys = []
+            # Pending entries on the stack hold no variables
+            for value in getattr(frame, "locals", ()):
+                size = value_size(value)
+                if size:
+                    key = id(value)
+                    entry = owners.get(key)
+                    if entry is None:
+                        entry = owners[key] = [0, size]
+                        self.stack_bytes += size
+                    entry[0] += 1
+                    keys.append(key)
+            frames.append((frame, keys))
+
+        used = self.stack_bytes
+        seen = set()
+        for values in (G.values(), L):
+            for value in values:
+                size = value_size(value)
+                if size and id(value) not in owners and id(value) not in seen:
+                    seen.add(id(value))
+                    used += size
+        max_memory = self.limits.max_memory
+        if used > max_memory:
+            raise LimitExceeded(f"Limit exceeded: Variables hold more than {max_memory} bytes at line {line}")
+        self.headroom = max_memory - used
+        return used
+
+    def check_value(self, value, L, G, stack, line):
+        """value has just been stored in a variable at line. Its size comes
+        out of the headroom, and memory is checked at once when that runs
+        out."""
+        size = value_size(value)
+        if size:
+            self.headroom -= size
+            if self.headroom < 0:
+                self.check_memory(L, G, stack, line)
+
+    def check_array(self, size, line):
+        """An array of size elements is about to be created at line."""
+        limits = self.limits
+        if limits.max_array is not None and size > limits.max_array:
+            raise LimitExceeded(
+                f"Limit exceeded: Array of {size} elements is larger than {limits.max_array} at line {line}")
+        if limits.max_memory is not None and size * 8 > limits.max_memory:
+            raise LimitExceeded(
+                f"Limit exceeded: Array of {size} elements is larger than {limits.max_memory} bytes at line {line}")
@@ -0,0 +1,203 @@
+# pathetic/nodes.py
+#
+# AST produced by pathetic.parser. Every node records the 1-based source
+# line it came from; expressions keep their source text, which is what the
+# evaluator compiles.
+
+
+class Node:
+    __slots__ = ("line",)
+    _fields = ()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class Expr(Node):
+    """An expression, kept as source text; written is the text as the user
+    wrote it, which error messages quote, when the optimizer has rewritten it."""
+    __slots__ = ("source", "written")
+    _fields = ("source",)
+
+    def __init__(self, source, line=None, written=None):
+        self.source = source
+        self.line = line
+        self.written = source if written is None else written
+
+
+class Call(Node):
+    """A call to a user-defined function: name(args...)."""
+    __slots__ = ("name", "args")
+    _fields = ("name", "args")
+
+    def __init__(self, name, args, line=None):
+        self.name = name
+        self.args = args
+        self.line = line
+
+
+class Program(Node):
+    __slots__ = ("body",)
+    _fields = ("body",)
+
+    def __init__(self, body, line=None):
+        self.body = body
+        self.line = line
+
+
+class Let(Node):
+    """let name = value, where value is an Expr or a Call."""
+    __slots__ = ("name", "value")
+    _fields = ("name", "value")
+
+    def __init__(self, name, value, line=None):
+        self.name = name
+        self.value = value
+        self.line = line
+
+
+class LetArray(Node):
+    """let name[size] = v1, v2, ... (values are already parsed constants)."""
+    __slots__ = ("name", "size", "values")
+    _fields = ("name", "size", "values")
+
+    def __init__(self, name, size, values, line=None):
+        self.name = name
+        self.size = size
+        self.values = values
+        self.line = line
+
+
+class Assign(Node):
+    __slots__ = ("name", "value")
+    _fields = ("name", "value")
+
+    def __init__(self, name, value, line=None):
+        self.name = name
+        self.value = value
+        self.line = line
+
+
+class SetItem(Node):
+    """name[index] = value"""
+    __slots__ = ("name", "index", "value")
+    _fields = ("name", "index", "value")
+
+    def __init__(self, name, index, value, line=None):
+        self.name = name
+        self.index = index
+        self.value = value
+        self.line = line
+
+
+class Get(Node):
+    """get(name) or get(name[size]); size is None for scalars."""
+    __slots__ = ("name", "size")
+    _fields = ("name", "size")
+
+    def __init__(self, name, size=None, line=None):
+        self.name = name
+        self.size = size
+        self.line = line
+
+
+class Say(Node):
+    """say "text" -- text is the literal body with escapes already decoded."""
+    __slots__ = ("text",)
+    _fields = ("text",)
+
+    def __init__(self, text, line=None):
+        self.text = text
+        self.line = line
+
+
+class SayF(Node):
+    """say f"template" -- template is the raw literal body. When the
+    optimizer has rewritten it, written is the template as the user wrote it
+    and written_exprs the text written for each {...} left in template."""
+    __slots__ = ("template", "written", "written_exprs")
+    _fields = ("template",)
+
+    def __init__(self, template, line=None, written=None, written_exprs=None):
+        self.template = template
+        self.line = line
+        self.written = template if written is None else written
+        self.written_exprs = written_exprs
+
+
+class ExprStmt(Node):
+    """A bare expression; its value is printed."""
+    __slots__ = ("value",)
+    _fields = ("value",)
+
+    def __init__(self, value, line=None):
+        self.value = value
+        self.line = line
+
+
+class CallStmt(Node):
+    __slots__ = ("call",)
+    _fields = ("call",)
+
+    def __init__(self, call, line=None):
+        self.call = call
+        self.line = line
+
+
+class Return(Node):
+    __slots__ = ("value",)
+    _fields = ("value",)
+
+    def __init__(self, value=None, line=None):
+        self.value = value
+        self.line = line
+
+
+class FuncDef(Node):
+    """[@memo(size)] func name(params) { body }; memo is the cache size or None"""
+    __slots__ = ("name", "params", "body", "memo")
+    _fields = ("name", "params", "body", "memo")
+
+    def __init__(self, name, params, body, line=None, memo=None):
+        self.name = name
+        self.params = params
+        self.body = body
+        self.line = line
+        self.memo = memo
+
+
+class If(Node):
+    __slots__ = ("cond", "body", "orelse")
+    _fields = ("cond", "body", "orelse")
+
+    def __init__(self, cond, body, orelse=None, line=None):
+        self.cond = cond
+        self.body = body
+        self.orelse = orelse
+        self.line = line
+
+
+class While(Node):
+    __slots__ = ("cond", "body")
+    _fields = ("cond", "body")
+
+    def __init__(self, cond, body, line=None):
+        self.cond = cond
+        self.body = body
+        self.line = line
+
+
+class For(Node):
+    """[parallel] for var as (init; cond; update) do { body }"""
+    __slots__ = ("var", "init", "cond", "update", "body", "parallel")
+    _fields = ("var", "init", "cond", "update", "body", "parallel")
+
+    def __init__(self, var, init, cond, update, body, line=None, parallel=False):
+        self.var = var
+        self.init = init
+        self.cond = cond
+        self.update = update
+        self.body = body
+        self.line = line
+        self.parallel = parallel
@@ -0,0 +1,366 @@
+# pathetic/optimizer.py
+#
+# An optimization pass over the parsed program, run before it is compiled.
+#
+# Level 1 folds constant subexpressions (`x * 60 * 60` is left alone, but
+# `x * (60 * 60)` becomes `x * 3600`) and removes if branches and while
+# loops whose condition is then known. Level 2, the default, also
+# propagates constants: a variable that a `let` at the top level of the
+# program (or of a function) sets to a constant, and that is never assigned
+# anywhere else, is replaced by its value in everything that runs after
+# that `let` -- the rest of the block. Function bodies only see their own
+# constants: a function can be called after a global it reads has changed,
+# by a later run in the same interpreter if not by this program. The `let`
+# itself stays, so the variable can still be read from f-strings, error
+# messages and Python.
+#
+# Folding only evaluates what running the program would have: an expression
+# that fails (`1 / 0`) or that would build a huge value is left to run
+# time. Rewritten expressions are turned back into source text, which is
+# what the compiler compiles and `pathetic run --dump-optimized` prints;
+# they remember the text the user wrote, which error messages still quote.
+
+import ast
+import math
+
+from .compiler import MAX_FOLDED_SIZE, _assigned_names, _text, cheap_operation
+from .errors import PatheticError
+from .expressions import split_fstring, translate_expression
+from .nodes import (
+    Assign, Call, CallStmt, Expr, ExprStmt, For, FuncDef, Get, If, Let, LetArray,
+    Program, Return, Say, SayF, SetItem, While,
+)
+
+DEFAULT_OPT_LEVEL = 2
+MAX_OPT_LEVEL = 2
+
+# Only values of these types are folded or propagated; arrays are shared,
+# not copied, so they never are.
+FOLDABLE = (int, float, str, bool)
+
+
+def optimize(program, level=DEFAULT_OPT_LEVEL):
+    """The program rewritten at optimization level (0 to MAX_OPT_LEVEL)."""
+    if level <= 0:
+        return program
+    optimizer = _Optimizer(level)
+    return Program(optimizer.scope(program.body, (), {}), program.line)
+
+
+class _Folder(ast.NodeTransformer):
+    """Replaces known constants and folds constant subexpressions."""
+
+    def __init__(self, constants):
+        self.constants = constants
+        self.changed = False
+
+    def visit_Name(self, node):
+        if node.id in self.constants:
+            self.changed = True
+            return _constant(self.constants[node.id])
+        return node
+
+    def visit_Call(self, node):
+        # The function name is not a variable
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if (_is_constant(node.left) and _is_constant(node.right)
+                and not cheap_operation(node.op, _value(node.left), _value(node.right))):
+            return node
+        return self.fold(node, (node.left, node.right))
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        return self.fold(node, (node.operand,))
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        return self.fold(node, [node.left] + node.comparators)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        values = list(node.values)
+        # a and b is b when a is true and a when it is false; `or` the other way round
+        keep_going = isinstance(node.op, ast.And)
+        while len(values) > 1 and _is_constant(values[0]):
+            if bool(_value(values[0])) != keep_going:
+                break
+            values.pop(0)
+        if len(values) > 1 and _is_constant(values[0]):
+            self.changed = True
+            return values[0]
+        if len(values) == 1:
+            self.changed = True
+            return values[0]
+        if len(values) != len(node.values):
+            self.changed = True
+            node.values = values
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if _is_constant(node.test):
+            self.changed = True
+            return node.body if _value(node.test) else node.orelse
+        return node
+
+    def fold(self, node, operands):
+        if not all(_is_constant(operand) for operand in operands):
+            return node
+        try:
+            value = eval(compile(ast.fix_missing_locations(ast.Expression(node)), "<pathetic>", "eval"),
+                         {"__builtins__": {}})
+        except Exception:
+            # Leave it to fail at run time with the usual error
+            return node
+        if not _foldable(value):
+            return node
+        self.changed = True
+        return _constant(value)
+
+
+def _foldable(value):
+    if type(value) not in FOLDABLE:
+        return False
+    if type(value) is float:
+        return math.isfinite(value)
+    if type(value) is str:
+        return len(value) <= MAX_FOLDED_SIZE
+    return type(value) is bool or abs(value).bit_length() <= MAX_FOLDED_SIZE
+
+
+def _constant(value):
+    # A negative number as -(n), so that it prints correctly next to any operator
+    if type(value) in (int, float) and value < 0:
+        return ast.UnaryOp(ast.USub(), ast.Constant(-value))
+    return ast.Constant(value)
+
+
+def _is_constant(node):
+    if isinstance(node, ast.Constant):
+        return True
+    return (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub)
+            and isinstance(node.operand, ast.Constant) and type(node.operand.value) in (int, float))
+
+
+def _value(node):
+    if isinstance(node, ast.Constant):
+        return node.value
+    return -node.operand.value
+
+
+class _Optimizer:
+    def __init__(self, level):
+        self.level = level
+
+    def scope(self, body, params, constants):
+        """Optimize the body of the program or of a function."""
+        counts = {}
+        for name in list(params) + _assigned_names(body, []):
+            counts[name] = counts.get(name, 0) + 1
+        return self.block(body, constants, counts)
+
+    def block(self, body, constants, counts=None):
+        """Optimize a list of statements; counts is given only for the top
+        level of a scope, where a `let` always runs."""
+        result = []
+        for stmt in body:
+            result.extend(self.statement(stmt, constants, counts))
+        return result
+
+    def statement(self, stmt, constants, counts):
+        """The statements that replace stmt."""
+        kind = type(stmt)
+        line = stmt.line
+
+        if kind is Let or kind is Assign:
+            if type(stmt.value) is Call:
+                return [kind(stmt.name, self.call(stmt.value, constants), line)]
+            value, known, result = self.expression(stmt.value, constants)
+            if (known and kind is Let and counts is not None and counts.get(stmt.name) == 1
+                    and self.level >= 2 and _foldable(result)):
+                constants[stmt.name] = result
+            return [kind(stmt.name, value, line)]
+
+        if kind is If:
+            cond, known, value = self.expression(stmt.cond, constants)
+            if known:
+                # Only one branch can ever run, and it always does
+                return self.block(stmt.body if value else stmt.orelse or [], constants, counts)
+            body = self.block(stmt.body, constants)
+            orelse = self.block(stmt.orelse, constants) if stmt.orelse else None
+            return [If(cond, body, orelse, line)]
+
+        if kind is While:
+            cond, known, value = self.expression(stmt.cond, constants)
+            if known and not value:
+                return []
+            return [While(cond, self.block(stmt.body, constants), line)]
+
+        if kind is For:
+            init = self.statement(stmt.init, constants, None)[0]
+            cond = self.expression(stmt.cond, constants)[0]
+            update = self.statement(stmt.update, constants, None)[0]
+            body = self.block(stmt.body, constants)
+            return [For(stmt.var, init, cond, update, body, line, stmt.parallel)]
+
+        if kind is FuncDef:
+            body = self.scope(stmt.body, stmt.params, {})
+            return [FuncDef(stmt.name, stmt.params, body, line, stmt.memo)]
+
+        if kind is SetItem:
+            index = self.expression(stmt.index, constants)[0]
+            value = self.expression(stmt.value, constants)[0]
+            return [SetItem(stmt.name, index, value, line)]
+
+        if kind is SayF:
+            return [self.fstring(stmt, constants)]
+
+        if kind is ExprStmt:
+            return [ExprStmt(self.expression(stmt.value, constants)[0], line)]
+
+        if kind is CallStmt:
+            return [CallStmt(self.call(stmt.call, constants), line)]
+
+        if kind is Return and stmt.value is not None:
+            return [Return(self.expression(stmt.value, constants)[0], line)]
+
+        return [stmt]
+
+    def expression(self, expr, constants):
+        """(Expr, known, value): the folded expression, and its value when it is a constant."""
+        try:
+            tree = ast.parse(translate_expression(expr.source), mode="eval")
+        except (SyntaxError, PatheticError):
+            # The compiler reports it
+            return expr, False, None
+        folder = _Folder(constants if self.level >= 2 else {})
+        body = folder.visit(tree.body)
+        if _is_constant(body):
+            value = _value(body)
+            known = type(value) in FOLDABLE
+        else:
+            value, known = None, False
+        if not folder.changed:
+            return expr, known, value
+        return Expr(ast.unparse(body), expr.line, expr.written), known, value
+
+    def call(self, call, constants):
+        args = [self.expression(arg, constants)[0] for arg in call.args]
+        return Call(call.name, args, call.line)
+
+    def fstring(self, stmt, constants):
+        parts = split_fstring(stmt.template)
+        if parts is None:
+            # The compiler reports it
+            return stmt
+        pieces = []
+        # What the user wrote for each {...} that stays
+        written = []
+        changed = False
+        for literal, source in parts:
+            pieces.append(_escape(literal))
+            if source is None:
+                continue
+            expr = Expr(source.strip(), stmt.line)
+            folded, known, value = self.expression(expr, constants)
+            text = _text(value)
+            if known and "{" not in text and "}" not in text:
+                pieces.append(_escape(text))
+                changed = True
+            else:
+                pieces.append("{" + _escape(folded.source) + "}")
+                written.append(source.strip())
+                changed = changed or folded is not expr
+        if not changed:
+            return stmt
+        return SayF("".join(pieces), stmt.line, stmt.written, tuple(written))
+
+
+def _escape(text):
+    """Text as written in a string literal, so that escape processing gives it back."""
+    return (text.replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n").replace("\t", "\\t").replace("\r", "\\r"))
+
+
+# --- Printing ---
+
+def format_program(program):
+    """Source text for a parsed (e.g. optimized) program."""
+    lines = []
+    _format_block(program.body, "", lines)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _format_call(call):
+    return f"{call.name}({', '.join(arg.source for arg in call.args)})"
+
+
+def _format_value(value):
+    if type(value) is str:
+        return f'"{_escape(value)}"'
+    return str(value)
+
+
+def _format_simple(stmt):
+    kind = type(stmt)
+    if kind is Let or kind is Assign:
+        value = _format_call(stmt.value) if type(stmt.value) is Call else stmt.value.source
+        return f"{'let ' if kind is Let else ''}{stmt.name} = {value}"
+    if kind is LetArray:
+        if type(stmt.values) is str:
+            values = _format_value(stmt.values)
+        else:
+            values = ", ".join(_format_value(value) for value in stmt.values)
+        return f"let {stmt.name}[{stmt.size}] = {values}"
+    if kind is SetItem:
+        return f"{stmt.name}[{stmt.index.source}] = {stmt.value.source}"
+    if kind is Get:
+        return f"get({stmt.name})" if stmt.size is None else f"get({stmt.name}[{stmt.size}])"
+    if kind is Say:
+        return f'say "{_escape(stmt.text)}"'
+    if kind is SayF:
+        return f'say f"{stmt.template}"'
+    if kind is ExprStmt:
+        return stmt.value.source
+    if kind is CallStmt:
+        return _format_call(stmt.call)
+    if kind is Return:
+        return "return" if stmt.value is None else f"return {stmt.value.source}"
+    raise ValueError(f"Cannot format {kind.__name__}")
+
+
+def _format_block(body, indent, lines):
+    inner = indent + "    "
+    for stmt in body:
+        kind = type(stmt)
+        if kind is FuncDef:
+            if stmt.memo is not None:
+                lines.append(f"{indent}@memo({stmt.memo})")
+            lines.append(f"{indent}func {stmt.name}({', '.join(stmt.params)}) {{")
+            _format_block(stmt.body, inner, lines)
+            lines.append(f"{indent}}}")
+        elif kind is If:
+            lines.append(f"{indent}if ({stmt.cond.source}) {{")
+            _format_block(stmt.body, inner, lines)
+            if stmt.orelse:
+                lines.append(f"{indent}}} else {{")
+                _format_block(stmt.orelse, inner, lines)
+            lines.append(f"{indent}}}")
+        elif kind is While:
+            lines.append(f"{indent}while ({stmt.cond.source})")
+            lines.append(f"{indent}do {{")
+            _format_block(stmt.body, inner, lines)
+            lines.append(f"{indent}}}")
+        elif kind is For:
+            header = f"for {stmt.var} as ({_format_simple(stmt.init)}; {stmt.cond.source}; " \
+                     f"{_format_simple(stmt.update)})"
+            lines.append(f"{indent}{'parallel ' if stmt.parallel else ''}{header}")
+            lines.append(f"{indent}do {{")
+            _format_block(stmt.body, inner, lines)
+            lines.append(f"{indent}}}")
+        else:
+            lines.append(indent + _format_simple(stmt))
@@ -0,0 +1,75 @@
+# pathetic/output.py
+#
+# Where `say` output goes. The VM writes through an OutputSink, which
+# collects text and hands it to the underlying stream in blocks: writing a
+# million short lines becomes a few hundred stream writes instead of a
+# million print() calls. A terminal gets its output immediately; anything
+# else (a pipe, a file, an in-memory buffer) is block buffered. The VM
+# flushes at the end of a run, before reading input and when an error
+# stops the program, so output order never changes.
+
+import sys
+
+# Buffer size used when the stream is not a terminal.
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+def _isatty(stream):
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+class OutputSink:
+    """Buffered writer for program output.
+
+    stream is any object with write() (a file, io.StringIO, ...); None means
+    sys.stdout as it is at write time. buffer_size is the number of
+    characters held before writing; 0 writes every piece straight through,
+    None picks 0 for a terminal and DEFAULT_BUFFER_SIZE otherwise.
+    """
+
+    def __init__(self, stream=None, buffer_size=None):
+        self.stream = stream
+        if buffer_size is None:
+            buffer_size = 0 if _isatty(stream or sys.stdout) else DEFAULT_BUFFER_SIZE
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        stream = self.stream or sys.stdout
+        if self.parts:
+            stream.write("".join(self.parts))
+            self.parts = []
+            self.size = 0
+        if hasattr(stream, "flush"):
+            stream.flush()
+
+
+def make_sink(output=None, buffer_size=None):
+    """An OutputSink for output, which may already be one or be a stream."""
+    if isinstance(output, OutputSink):
+        return output
+    return OutputSink(output, buffer_size)
+
+
+def parse_buffer_size(text):
+    """Parse a --output-buffer value: bytes, optionally with a k or m suffix."""
+    text = text.strip().lower()
+    scale = 1
+    if text.endswith("k"):
+        scale, text = 1024, text[:-1]
+    elif text.endswith("m"):
+        scale, text = 1024 * 1024, text[:-1]
+    size = int(text) * scale
+    if size < 0:
+        raise ValueError("buffer size cannot be negative")
+    return size
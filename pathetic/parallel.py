@@ -0,0 +1,176 @@
+# pathetic/parallel.py
+#
+# Runs `parallel for` loops on every core.
+#
+# The compiler has already proved that the loop's iterations are
+# independent (see _ParallelCheck in pathetic.compiler) and compiled its
+# body into a kernel: a function of (start, stop) that runs the loop for
+# the values from start up to stop. Here the loop's values are cut into one
+# chunk per worker. Each worker gets a copy of the variables the body
+# reads, runs its chunk and sends back the elements of the written arrays
+# in that chunk, plus the loop's private variables, which are copied into
+# the real arrays and variables in loop order. Workers are processes, or
+# threads on a free-threaded (no-GIL) build of Python, where no copies are
+# needed; the pool is started on first use and kept for the rest of the
+# run.
+#
+# Short loops are not worth the copying and run in the VM as ordinary
+# loops, as does every loop when the run is traced, profiled, limited or
+# cooperative, and any loop in a process that is itself a worker (batch,
+# serve, or another parallel for).
+
+import atexit
+import marshal
+import os
+import signal
+import sys
+import threading
+from functools import lru_cache
+
+from .arrays import Array, ObjectArray
+from .compiler import UNBOUND, Code
+
+# Fewer iterations than this run in the VM.
+MIN_ITERATIONS = 4096
+
+# Cleared in worker processes, which already have a core to themselves.
+enabled = True
+
+_pool = None
+_thread = threading.local()
+
+
+def worker_count():
+    count = os.process_cpu_count() if hasattr(os, "process_cpu_count") else os.cpu_count()
+    return count or 1
+
+
+def free_threaded():
+    """Whether this Python runs threads in parallel (a no-GIL build)."""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def init_worker():
+    """Set up a pool worker: Ctrl-C is for the parent, and loops stay in the worker."""
+    global enabled
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    enabled = False
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        if free_threaded():
+            from concurrent.futures import ThreadPoolExecutor
+            _pool = ThreadPoolExecutor(max_workers=worker_count())
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            _pool = ProcessPoolExecutor(max_workers=worker_count(), initializer=init_worker)
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+def split(values, parts):
+    """values (a range) cut into at most parts consecutive ranges."""
+    size = -(-len(values) // parts)
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def window(values):
+    """The slice selecting the elements at the indexes in values, in increasing order."""
+    if values.step < 0:
+        values = values[::-1]
+    return slice(values.start, values.stop, values.step)
+
+
+def run_loop(functions, frame, a, b):
+    """Run the PARALLEL_FOR instruction (a, b) in frame on the workers.
+
+    Returns False, having done nothing, when the loop should run in the VM
+    instead.
+    """
+    from .vm import counted_values
+
+    dest, kernel, free, written, private, calls = a
+    if getattr(_thread, "in_chunk", False):
+        # A parallel for inside another one, on a worker thread
+        return False
+    if any(name in functions for name in calls):
+        # A user function replaces a built-in and may have side effects
+        return False
+    L, G = frame.locals, frame.globals
+    start = L[dest] if type(dest) is int else G[dest]
+    values = counted_values(start, b[0](L, G), b[1], b[2])
+    if values is None or len(values) < MIN_ITERATIONS:
+        return False
+    workers = worker_count()
+    if workers < 2:
+        return False
+
+    env = {}
+    for name in free:
+        value = frame.get(name, UNBOUND)
+        if value is not UNBOUND:
+            env[name] = value
+    arrays = [value for value in env.values() if type(value) in (Array, ObjectArray, list)]
+    if len({id(array) for array in arrays}) < len(arrays):
+        # Two names for one array: a write could be read through the other
+        return False
+    first, last = min(values[0], values[-1]), max(values[0], values[-1])
+    for name in written:
+        array = env.get(name)
+        if type(array) not in (Array, ObjectArray, list) or first < 0 or last >= len(array):
+            # Let the VM report the error
+            return False
+
+    pool = get_pool()
+    copies = not free_threaded()
+    data = marshal.dumps(kernel.to_data())
+    chunks = split(values, workers)
+    futures = [pool.submit(run_chunk, data, chunk.start, chunk.stop, env, written if copies else (),
+                           window(chunk))
+               for chunk in chunks]
+    # Waiting in loop order, so the error an ordinary loop would hit first is raised
+    results = [future.result() for future in futures]
+    for chunk, (state, pieces) in zip(chunks, results):
+        part = window(chunk)
+        for name, piece in zip(written, pieces):
+            env[name][part] = piece
+    state = results[-1][0]
+    for (name, target), value in zip(private, state):
+        if type(target) is int:
+            L[target] = value
+        else:
+            G[target] = value
+    end = values.start + len(values) * values.step
+    if type(dest) is int:
+        L[dest] = end
+    else:
+        G[dest] = end
+    return True
+
+
+@lru_cache(maxsize=16)
+def load_kernel(data):
+    return Code.from_data(marshal.loads(data))
+
+
+def run_chunk(data, start, stop, env, written, part):
+    """Run a kernel over start..stop in a worker.
+
+    Returns the private values and the elements of each written array
+    selected by part.
+    """
+    from .vm import VM, Frame
+
+    kernel = load_kernel(data)
+    frame = Frame(kernel, [start, stop] + [UNBOUND] * (len(kernel.varnames) - 2), env)
+    _thread.in_chunk = True
+    try:
+        next(VM({}).execute(frame))
+    except StopIteration as done:
+        state = done.value
+    finally:
+        _thread.in_chunk = False
+    return state, [env[name][part] for name in written]
@@ -0,0 +1,448 @@
+# pathetic/parser.py
+
+import re
+
+from .errors import PatheticSyntaxError
+from .lexer import tokenize, tokenize_line
+from .nodes import (
+    Assign, Call, CallStmt, Expr, ExprStmt, For, FuncDef, Get, If, Let,
+    LetArray, Program, Return, Say, SayF, SetItem, While,
+)
+from .values import parse_value, process_escape_sequences
+
+IDENTIFIER = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+
+# Results an @memo function keeps when no size is given.
+MEMO_SIZE = 65536
+
+
+def parse(source):
+    """Parse Pathetic source into a Program node."""
+    return Parser(tokenize(source)).parse_program()
+
+
+def parse_line(text, lineno=1):
+    """Parse a single self-contained statement (no blocks)."""
+    tokens = tokenize_line(text, lineno)
+    if not tokens:
+        return None
+    parser = Parser([])
+    return parser.parse_simple(tokens, text, lineno)
+
+
+def _is_op(token, value):
+    return token.kind == "OP" and token.value == value
+
+
+def _matching_paren(tokens, start):
+    """Index of the ')' or ']' closing the bracket at tokens[start], or -1."""
+    depth = 0
+    for i in range(start, len(tokens)):
+        value = tokens[i].value if tokens[i].kind == "OP" else None
+        if value in ("(", "["):
+            depth += 1
+        elif value in (")", "]"):
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _split_commas(tokens):
+    """Split a token list on top-level commas."""
+    parts, current, depth = [], [], 0
+    for token in tokens:
+        if token.kind == "OP":
+            if token.value in ("(", "["):
+                depth += 1
+            elif token.value in (")", "]"):
+                depth -= 1
+            elif token.value == "," and depth == 0:
+                parts.append(current)
+                current = []
+                continue
+        current.append(token)
+    parts.append(current)
+    return parts
+
+
+class Parser:
+    def __init__(self, lines):
+        self.lines = lines
+        self.pos = 0
+
+    # --- Helpers ---
+
+    def error(self, message, lineno, text):
+        raise PatheticSyntaxError(message, lineno, text.strip())
+
+    def source(self, tokens, text):
+        """Source text spanned by a token slice."""
+        return text[tokens[0].col:tokens[-1].end].strip()
+
+    def expr(self, tokens, text, lineno, what="expression"):
+        if not tokens:
+            self.error(f"Missing {what}", lineno, text)
+        return Expr(self.source(tokens, text), lineno)
+
+    def name(self, token, text, lineno, what="variable"):
+        if token.kind != "NAME" or not IDENTIFIER.fullmatch(token.value):
+            self.error(f"Invalid {what} name '{token.value}'", lineno, text)
+        return token.value
+
+    def call(self, tokens, text, lineno):
+        """Return a Call if tokens are exactly name(args...), else None."""
+        if len(tokens) < 3 or tokens[0].kind != "NAME" or not _is_op(tokens[1], "("):
+            return None
+        if _matching_paren(tokens, 1) != len(tokens) - 1:
+            return None
+        name = tokens[0].value
+        if name == "get":
+            self.error("'get' is a reserved keyword, not a function", lineno, text)
+        inner = tokens[2:-1]
+        args = [self.expr(part, text, lineno, "argument") for part in _split_commas(inner)] if inner else []
+        return Call(name, args, lineno)
+
+    # --- Blocks ---
+
+    def parse_program(self):
+        body = self.parse_block(top_level=True)
+        return Program(body, 1)
+
+    def parse_block(self, top_level=False):
+        body = []
+        while self.pos < len(self.lines):
+            line = self.lines[self.pos]
+            if _is_op(line.tokens[0], "}"):
+                if top_level:
+                    self.error("Unexpected '}'", line.lineno, line.text)
+                return body
+            body.append(self.parse_statement())
+        return body
+
+    def open_block(self, header, opener, tokens):
+        """Consume the '{' that starts a block.
+
+        The brace may end the header line itself (tokens is what is left of
+        the header after the construct) or sit on the following line, as in
+        'do {' after a for/while header. Returns the parsed body.
+        """
+        keyword = opener.split()[0] if opener != "{" else None
+        if tokens:
+            expected = [keyword, "{"] if keyword else ["{"]
+            if [t.value for t in tokens] != expected:
+                self.error(f"Expected '{opener}'", header.lineno, header.text)
+        else:
+            if self.pos >= len(self.lines):
+                self.error(f"Expected '{opener}' block", header.lineno, header.text)
+            line = self.lines[self.pos]
+            values = [t.value for t in line.tokens]
+            expected = [keyword, "{"] if keyword else ["{"]
+            if values != expected:
+                self.error(f"Expected '{opener}'", line.lineno, line.text)
+            self.pos += 1
+        return self.close_block(header, opener)
+
+    def close_block(self, header, opener):
+        body = self.parse_block()
+        if self.pos >= len(self.lines):
+            self.error(f"No matching '}}' found for '{opener}'", header.lineno, header.text)
+        return body
+
+    def end_block(self):
+        """Consume a closing '}' line; returns the tokens that follow it."""
+        line = self.lines[self.pos]
+        self.pos += 1
+        return line.tokens[1:]
+
+    # --- Statements ---
+
+    def parse_statement(self):
+        line = self.lines[self.pos]
+        # Only NAME tokens can spell a keyword, so the value alone is enough
+        block = BLOCK_STATEMENTS.get(line.tokens[0].value)
+        if block is not None:
+            return block(self, line)
+        self.pos += 1
+        return self.parse_simple(line.tokens, line.text, line.lineno)
+
+    def parse_func(self, line):
+        tokens, text, lineno = line.tokens, line.text, line.lineno
+        self.pos += 1
+        if len(tokens) < 4 or not _is_op(tokens[2], "("):
+            self.error("Invalid function definition", lineno, text)
+        name = self.name(tokens[1], text, lineno, "function")
+        close = _matching_paren(tokens, 2)
+        if close == -1:
+            self.error("Invalid function definition", lineno, text)
+        params = []
+        inner = tokens[3:close]
+        if inner:
+            for part in _split_commas(inner):
+                if len(part) != 1:
+                    self.error("Invalid parameter list", lineno, text)
+                params.append(self.name(part[0], text, lineno, "parameter"))
+        if len(set(params)) != len(params):
+            self.error(f"Duplicate parameter in function '{name}'", lineno, text)
+        body = self.open_block(line, "{", tokens[close + 1:])
+        trailing = self.end_block()
+        if trailing:
+            self.error("Unexpected tokens after '}'", lineno, text)
+        return FuncDef(name, params, body, lineno)
+
+    def parse_memo(self, line):
+        """@memo or @memo(size), then a function on the same or the next line."""
+        tokens, text, lineno = line.tokens, line.text, line.lineno
+        if len(tokens) < 2 or tokens[1].value != "memo":
+            self.error("Unknown decorator", lineno, text)
+        size = MEMO_SIZE
+        rest = tokens[2:]
+        if rest and _is_op(rest[0], "("):
+            if (len(rest) < 3 or rest[1].kind != "NUMBER" or "." in rest[1].value
+                    or not _is_op(rest[2], ")") or int(rest[1].value) < 1):
+                self.error("Invalid memo cache size", lineno, text)
+            size = int(rest[1].value)
+            rest = rest[3:]
+        if rest:
+            if rest[0].value != "func":
+                self.error("Expected 'func' after '@memo'", lineno, text)
+            func = self.parse_func(line._replace(tokens=rest))
+        else:
+            self.pos += 1
+            if self.pos >= len(self.lines) or self.lines[self.pos].tokens[0].value != "func":
+                self.error("Expected 'func' after '@memo'", lineno, text)
+            func = self.parse_func(self.lines[self.pos])
+        func.memo = size
+        return func
+
+    def parse_for(self, line):
+        tokens, text, lineno = line.tokens, line.text, line.lineno
+        self.pos += 1
+        if (len(tokens) < 5 or tokens[2].value != "as" or not _is_op(tokens[3], "(")):
+            self.error("Invalid for loop syntax", lineno, text)
+        var = self.name(tokens[1], text, lineno, "loop variable")
+        close = _matching_paren(tokens, 3)
+        if close == -1:
+            self.error("Invalid for loop syntax", lineno, text)
+        parts, current = [], []
+        for token in tokens[4:close]:
+            if _is_op(token, ";"):
+                parts.append(current)
+                current = []
+            else:
+                current.append(token)
+        parts.append(current)
+        if len(parts) != 3:
+            self.error("For loop must have 3 components", lineno, text)
+        if not all(parts):
+            self.error("For loop components cannot be empty", lineno, text)
+        init = self.parse_simple(parts[0], text, lineno)
+        cond = self.expr(parts[1], text, lineno, "loop condition")
+        update = self.parse_simple(parts[2], text, lineno)
+        body = self.open_block(line, "do {", tokens[close + 1:])
+        if self.end_block():
+            self.error("Unexpected tokens after '}'", lineno, text)
+        return For(var, init, cond, update, body, lineno)
+
+    def parse_parallel(self, line):
+        tokens = line.tokens
+        if len(tokens) < 2 or tokens[1].value != "for":
+            # An ordinary statement about a variable named parallel
+            self.pos += 1
+            return self.parse_simple(tokens, line.text, line.lineno)
+        loop = self.parse_for(line._replace(tokens=tokens[1:]))
+        loop.parallel = True
+        return loop
+
+    def parse_while(self, line):
+        tokens, text, lineno = line.tokens, line.text, line.lineno
+        self.pos += 1
+        if len(tokens) < 3 or not _is_op(tokens[1], "("):
+            self.error("Invalid while loop syntax", lineno, text)
+        close = _matching_paren(tokens, 1)
+        if close == -1:
+            self.error("Invalid while loop syntax", lineno, text)
+        cond = self.expr(tokens[2:close], text, lineno, "loop condition")
+        rest = tokens[close + 1:]
+        if not rest:
+            if self.pos >= len(self.lines):
+                self.error("Expected 'do' after 'while'", lineno, text)
+            do_line = self.lines[self.pos]
+            rest, text, lineno = do_line.tokens, do_line.text, do_line.lineno
+            self.pos += 1
+        if rest[0].value != "do" or len(rest) < 2:
+            self.error("Expected 'do' after 'while'", lineno, text)
+        if _is_op(rest[1], "(") and _matching_paren(rest, 1) == len(rest) - 1:
+            # Single statement form: do (statement)
+            body = [self.parse_simple(rest[2:-1], text, lineno)]
+            return While(cond, body, line.lineno)
+        if len(rest) != 2 or not _is_op(rest[1], "{"):
+            self.error("Expected 'do {' or 'do (...)' after 'while'", lineno, text)
+        body = self.close_block(line, "do {")
+        if self.end_block():
+            self.error("Unexpected tokens after '}'", lineno, text)
+        return While(cond, body, line.lineno)
+
+    def parse_if(self, line):
+        tokens, text, lineno = line.tokens, line.text, line.lineno
+        self.pos += 1
+        if len(tokens) < 3 or not _is_op(tokens[1], "("):
+            self.error("Invalid if statement", lineno, text)
+        close = _matching_paren(tokens, 1)
+        if close == -1:
+            self.error("Invalid if statement", lineno, text)
+        cond = self.expr(tokens[2:close], text, lineno, "condition")
+        body = self.open_block(line, "{", tokens[close + 1:])
+        trailing = self.end_block()
+        orelse = None
+        if not trailing and self.pos < len(self.lines):
+            following = self.lines[self.pos]
+            if following.tokens[0].value == "else":
+                trailing = following.tokens
+                self.pos += 1
+        if trailing:
+            if [t.value for t in trailing] != ["else", "{"]:
+                self.error("Expected 'else {'", lineno, text)
+            orelse = self.close_block(line, "else {")
+            if self.end_block():
+                self.error("Unexpected tokens after '}'", lineno, text)
+        return If(cond, body, orelse, lineno)
+
+    def parse_simple(self, tokens, text, lineno):
+        """Parse a statement that fits on one line."""
+        first = tokens[0]
+        keyword = SIMPLE_STATEMENTS.get(first.value)
+        if keyword is not None:
+            return keyword(self, tokens, text, lineno)
+
+        if first.kind == "NAME" and len(tokens) > 1:
+            second = tokens[1]
+            if second.kind == "OP":
+                assignment = ASSIGNMENTS.get(second.value)
+                if assignment is not None:
+                    stmt = assignment(self, tokens, text, lineno)
+                    if stmt is not None:
+                        return stmt
+            call = self.call(tokens, text, lineno)
+            if call is not None:
+                return CallStmt(call, lineno)
+
+        return ExprStmt(self.expr(tokens, text, lineno), lineno)
+
+    def parse_get(self, tokens, text, lineno):
+        if len(tokens) < 4 or not _is_op(tokens[1], "(") or not _is_op(tokens[-1], ")"):
+            self.error("Invalid get statement", lineno, text)
+        inner = tokens[2:-1]
+        name = self.name(inner[0], text, lineno)
+        if len(inner) == 1:
+            return Get(name, None, lineno)
+        if (len(inner) == 4 and _is_op(inner[1], "[") and inner[2].kind == "NUMBER"
+                and "." not in inner[2].value and _is_op(inner[3], "]")):
+            return Get(name, int(inner[2].value), lineno)
+        self.error("Invalid array input", lineno, text)
+
+    def parse_return(self, tokens, text, lineno):
+        if len(tokens) == 1:
+            return Return(None, lineno)
+        return Return(self.expr(tokens[1:], text, lineno), lineno)
+
+    def parse_say(self, tokens, text, lineno):
+        if len(tokens) != 2 or tokens[1].kind not in ("STRING", "FSTRING"):
+            self.error("Invalid string format", lineno, text)
+        literal = tokens[1].value
+        if tokens[1].kind == "FSTRING":
+            return SayF(literal[2:-1], lineno)
+        return Say(process_escape_sequences(literal[1:-1]), lineno)
+
+    def parse_misplaced(self, tokens, text, lineno):
+        first = tokens[0]
+        if first.kind == "NAME":
+            self.error(f"'{first.value}' is not allowed here", lineno, text)
+        if first.kind == "OP":
+            self.error(f"Unexpected '{first.value}'", lineno, text)
+        return ExprStmt(self.expr(tokens, text, lineno), lineno)
+
+    def parse_assign(self, tokens, text, lineno):
+        name = self.name(tokens[0], text, lineno)
+        return Assign(name, self.expr(tokens[2:], text, lineno), lineno)
+
+    def parse_set_item(self, tokens, text, lineno):
+        """name[index] = value; None when the line is not an assignment."""
+        close = _matching_paren(tokens, 1)
+        if close == -1 or close + 1 >= len(tokens) or not _is_op(tokens[close + 1], "="):
+            return None
+        name = self.name(tokens[0], text, lineno)
+        index = self.expr(tokens[2:close], text, lineno, "index")
+        value = self.expr(tokens[close + 2:], text, lineno)
+        return SetItem(name, index, value, lineno)
+
+    def parse_update(self, tokens, text, lineno):
+        """name += value, -=, *= and /=."""
+        name = self.name(tokens[0], text, lineno)
+        value = self.expr(tokens[2:], text, lineno)
+        return Assign(name, Expr(f"{name} {tokens[1].value[0]} ({value.source})", lineno), lineno)
+
+    def parse_step(self, tokens, text, lineno):
+        """name++ and name--; None when more follows."""
+        if len(tokens) != 2:
+            return None
+        name = self.name(tokens[0], text, lineno)
+        op = "+" if tokens[1].value == "++" else "-"
+        return Assign(name, Expr(f"{name} {op} 1", lineno), lineno)
+
+    def parse_let(self, tokens, text, lineno):
+        if len(tokens) < 4:
+            self.error("Invalid declaration", lineno, text)
+        name = self.name(tokens[1], text, lineno)
+        if _is_op(tokens[2], "["):
+            if (len(tokens) < 6 or tokens[3].kind != "NUMBER" or "." in tokens[3].value
+                    or not _is_op(tokens[4], "]") or not _is_op(tokens[5], "=")):
+                self.error("Invalid array declaration", lineno, text)
+            size = int(tokens[3].value)
+            rest = tokens[6:]
+            if len(rest) == 1 and rest[0].kind == "STRING":
+                values = parse_value(rest[0].value)
+            else:
+                values = [parse_value(self.source(part, text)) for part in _split_commas(rest) if part]
+            return LetArray(name, size, values, lineno)
+        if not _is_op(tokens[2], "="):
+            self.error("Invalid declaration", lineno, text)
+        value = self.call(tokens[3:], text, lineno) or self.expr(tokens[3:], text, lineno)
+        return Let(name, value, lineno)
+
+
+# --- Dispatch tables ---
+
+# Statements that open a block, keyed by their first token.
+BLOCK_STATEMENTS = {
+    "func": Parser.parse_func,
+    "for": Parser.parse_for,
+    "parallel": Parser.parse_parallel,
+    "while": Parser.parse_while,
+    "if": Parser.parse_if,
+    "@": Parser.parse_memo,
+}
+
+# One-line statements, keyed by their first token. Block keywords and
+# braces cannot start one.
+SIMPLE_STATEMENTS = {
+    "let": Parser.parse_let,
+    "get": Parser.parse_get,
+    "return": Parser.parse_return,
+    "say": Parser.parse_say,
+}
+for _keyword in ("func", "for", "while", "if", "else", "do", "{", "}", "@"):
+    SIMPLE_STATEMENTS[_keyword] = Parser.parse_misplaced
+
+# Statements of the form `name <op> ...`, keyed by the operator. A handler
+# may return None to fall back to a call or expression statement.
+ASSIGNMENTS = {
+    "=": Parser.parse_assign,
+    "[": Parser.parse_set_item,
+    "+=": Parser.parse_update,
+    "-=": Parser.parse_update,
+    "*=": Parser.parse_update,
+    "/=": Parser.parse_update,
+    "++": Parser.parse_step,
+    "--": Parser.parse_step,
+}
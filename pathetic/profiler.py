@@ -0,0 +1,340 @@
+# pathetic/profiler.py
+#
+# `pathetic run --profile`: where a program spends its time.
+#
+# The Profiler is a tracer (see pathetic.instrument): the VM reports every
+# instruction it is about to execute, and every call, tail call and return.
+# The time between two instructions is charged to the first one, which
+# gives exact self time per instruction; instructions carry the source line
+# they were compiled from, so this adds up to per-line and per-function
+# self time. Calls are tracked on a stack
+# to get cumulative time (self time plus callees) for functions and for the
+# lines that call them, counting recursive calls only once, as cProfile
+# does.
+#
+# Calls to @memo functions are also counted as cache hits and misses; a
+# hit shows up as a call that returns at once.
+#
+# Results can be printed as a sorted report, saved in the format of
+# Python's pstats module (marshal'd, loadable with pstats.Stats) or saved as
+# a speedscope (https://www.speedscope.app) JSON profile.
+
+import json
+import marshal
+import os
+import sys
+import time
+
+from . import __version__
+
+# Deepest call tree kept for the speedscope profile; deeper calls are
+# charged to the node at this depth. Direct recursion is folded into one
+# node regardless.
+MAX_TREE_DEPTH = 256
+
+
+class _Entry:
+    """One active call."""
+
+    __slots__ = ("code", "start", "child", "caller", "node")
+
+    def __init__(self, code, start, caller, node):
+        self.code = code
+        self.start = start
+        # Time spent in calls made from this one
+        self.child = 0.0
+        # (caller Code, line of its CALL instruction), or None for the program
+        self.caller = caller
+        # Call tree node, for speedscope
+        self.node = node
+
+
+class Profiler:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # Code -> per-instruction execution counts and self times
+        self.counts = {}
+        self.times = {}
+        # Code -> per-instruction self time outside calls made from the same line
+        self.outer_times = {}
+        # (Code, line) -> time spent in the calls made from that line
+        self.call_times = {}
+        # Function name -> [primitive calls, calls, self time, cumulative time]
+        self.functions = {}
+        # (caller name, callee name) -> [primitive calls, calls, self time, cumulative time]
+        self.edges = {}
+        # Function name -> Code, for file positions
+        self.codes = {}
+        # @memo function name -> [cache hits, misses]
+        self.memos = {}
+        # Call tree: node -> (parent node, function name); self time per node
+        self.nodes = [(None, None)]
+        self.children = {}
+        self.node_times = [0.0]
+        self.stack = []
+        # Entries per function, and calls per (Code, line), currently active
+        self.active = {}
+        self.active_sites = {}
+        self.current = None
+        self.last = 0.0
+        self.started = None
+        self.total = 0.0
+
+    # --- Events from the VM (see pathetic.instrument) ---
+
+    def start(self, frame):
+        now = self.clock()
+        if self.started is None:
+            self.started = now
+        self.last = now
+        self.enter(frame.code, now, None)
+
+    def step(self, frame, index):
+        """frame is about to execute instruction index."""
+        now = self.clock()
+        self.charge(now)
+        code = frame.code
+        counts = self.counts.get(code)
+        if counts is None:
+            counts = self.counts[code] = [0] * len(code.instructions)
+            self.times[code] = [0.0] * len(code.instructions)
+            self.outer_times[code] = [0.0] * len(code.instructions)
+        counts[index] += 1
+        self.current = (code, index)
+
+    def call(self, callee, frame, index):
+        """The CALL at frame's instruction index entered callee."""
+        now = self.clock()
+        self.charge(now)
+        code = frame.code
+        self.enter(callee.code, now, (code, code.lines[index]))
+
+    def tail_call(self, callee):
+        """The running function was replaced by callee."""
+        now = self.clock()
+        self.charge(now)
+        caller = self.stack[-1].caller
+        self.leave(now)
+        self.enter(callee.code, now, caller)
+
+    def ret(self, value):
+        now = self.clock()
+        self.charge(now)
+        self.leave(now)
+
+    def say(self, text):
+        pass
+
+    def get(self, name, value):
+        pass
+
+    def memo(self, name, hit):
+        stats = self.memos.get(name)
+        if stats is None:
+            stats = self.memos[name] = [0, 0]
+        stats[0 if hit else 1] += 1
+
+    def stop(self):
+        """End profiling, closing calls left open by an error."""
+        now = self.clock()
+        self.charge(now)
+        while self.stack:
+            self.leave(now)
+        if self.started is not None:
+            self.total = now - self.started
+
+    # --- Bookkeeping ---
+
+    def charge(self, now):
+        """Charge the time since the last event to the current instruction."""
+        current = self.current
+        if current is not None:
+            code, index = current
+            elapsed = now - self.last
+            self.times[code][index] += elapsed
+            # Recursion: a deeper run of a line is already inside its outer call
+            if not self.active_sites.get((code, code.lines[index])):
+                self.outer_times[code][index] += elapsed
+            self.current = None
+        self.last = now
+
+    def enter(self, code, now, caller):
+        name = code.name
+        self.codes.setdefault(name, code)
+        parent = self.stack[-1].node if self.stack else 0
+        if self.nodes[parent][1] == name:
+            node = parent
+        elif len(self.stack) >= MAX_TREE_DEPTH:
+            node = parent
+        else:
+            node = self.children.get((parent, name))
+            if node is None:
+                node = self.children[(parent, name)] = len(self.nodes)
+                self.nodes.append((parent, name))
+                self.node_times.append(0.0)
+        self.stack.append(_Entry(code, now, caller, node))
+        self.active[name] = self.active.get(name, 0) + 1
+        if caller is not None:
+            self.active_sites[caller] = self.active_sites.get(caller, 0) + 1
+
+    def leave(self, now):
+        entry = self.stack.pop()
+        name = entry.code.name
+        elapsed = now - entry.start
+        own = elapsed - entry.child
+        self.node_times[entry.node] += own
+
+        self.active[name] -= 1
+        outermost = self.active[name] == 0
+        stats = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = [0, 0, 0.0, 0.0]
+        stats[1] += 1
+        stats[2] += own
+        if outermost:
+            stats[0] += 1
+            stats[3] += elapsed
+
+        if self.stack:
+            self.stack[-1].child += elapsed
+        caller = entry.caller
+        if caller is not None:
+            self.active_sites[caller] -= 1
+            if self.active_sites[caller] == 0:
+                self.call_times[caller] = self.call_times.get(caller, 0.0) + elapsed
+            edge = self.edges.get((caller[0].name, name))
+            if edge is None:
+                edge = self.edges[(caller[0].name, name)] = [0, 0, 0.0, 0.0]
+            edge[1] += 1
+            edge[2] += own
+            if outermost:
+                edge[0] += 1
+                edge[3] += elapsed
+
+    # --- Results ---
+
+    def line_stats(self):
+        """{line: [hits, self time, cumulative time]} over all code.
+
+        A line's hits are the executions of its most executed instruction;
+        its cumulative time adds the calls made from it.
+        """
+        lines = {}
+        for code, counts in self.counts.items():
+            times = self.times[code]
+            outer_times = self.outer_times[code]
+            for index, count in enumerate(counts):
+                line = code.lines[index]
+                if line is None or not count:
+                    continue
+                stats = lines.get(line)
+                if stats is None:
+                    stats = lines[line] = [0, 0.0, self.call_times.get((code, line), 0.0)]
+                stats[0] = max(stats[0], count)
+                stats[1] += times[index]
+                stats[2] += outer_times[index]
+        return lines
+
+    def function_line(self, name):
+        lines = [line for line in self.codes[name].lines if line is not None]
+        return min(lines) if lines else 0
+
+    def report(self, source_lines=(), limit=30):
+        """The sorted text report; source_lines are the program's lines."""
+        out = [f"Profile: {self.total * 1000:.3f} ms total", ""]
+        out.append("Functions (by self time)")
+        out.append(f"{'calls':>10} {'self ms':>10} {'cum ms':>10}  function")
+        functions = sorted(self.functions.items(), key=lambda item: item[1][2], reverse=True)
+        for name, (primitive, calls, own, cumulative) in functions:
+            shown = str(calls) if primitive == calls else f"{calls}/{primitive}"
+            out.append(f"{shown:>10} {own * 1000:>10.3f} {cumulative * 1000:>10.3f}  "
+                       f"{name} (line {self.function_line(name)})")
+        if self.memos:
+            out.append("")
+            out.append("Memoized functions")
+            out.append(f"{'hits':>10} {'misses':>10} {'hit rate':>10}  function")
+            for name, (hits, misses) in sorted(self.memos.items()):
+                out.append(f"{hits:>10} {misses:>10} {hits / (hits + misses):>10.1%}  {name}")
+        out.append("")
+        out.append(f"Lines (by self time, top {limit})")
+        out.append(f"{'line':>6} {'hits':>10} {'self ms':>10} {'cum ms':>10}  source")
+        lines = sorted(self.line_stats().items(), key=lambda item: item[1][1], reverse=True)
+        for line, (hits, own, cumulative) in lines[:limit]:
+            text = source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ""
+            out.append(f"{line:>6} {hits:>10} {own * 1000:>10.3f} {cumulative * 1000:>10.3f}  {text}")
+        return "\n".join(out)
+
+    def pstats_data(self, filename):
+        """Statistics in the layout pstats.Stats loads."""
+        def key(name):
+            return (filename, self.function_line(name), name)
+
+        callers = {}
+        for (caller, callee), (primitive, calls, own, cumulative) in self.edges.items():
+            callers.setdefault(callee, {})[key(caller)] = (primitive, calls, own, cumulative)
+        return {
+            key(name): (primitive, calls, own, cumulative, callers.get(name, {}))
+            for name, (primitive, calls, own, cumulative) in self.functions.items()
+        }
+
+    def save_pstats(self, path, filename):
+        with open(path, "wb") as f:
+            marshal.dump(self.pstats_data(filename), f)
+
+    def speedscope_data(self, filename):
+        frames = []
+        frame_index = {}
+        samples, weights = [], []
+        stacks = {0: []}
+        for node in range(1, len(self.nodes)):
+            parent, name = self.nodes[node]
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({"name": name, "file": filename, "line": self.function_line(name)})
+            # Parents are always created before their children
+            stacks[node] = stacks[parent] + [frame_index[name]]
+            if self.node_times[node] > 0:
+                samples.append(stacks[node])
+                weights.append(self.node_times[node])
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": filename,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": filename,
+            "activeProfileIndex": 0,
+            "exporter": f"pathetic {__version__}",
+        }
+
+    def save_speedscope(self, path, filename):
+        with open(path, "w") as f:
+            json.dump(self.speedscope_data(filename), f)
+
+
+def write_profile(profiler, source_path, output_path=None, stream=None):
+    """Print the report for a profiled run of source_path and save the profile.
+
+    The profile goes to output_path, or <name>.prof in the current
+    directory; a .json path gets speedscope format, anything else pstats.
+    """
+    stream = stream or sys.stderr
+    try:
+        with open(source_path, "r") as f:
+            source_lines = f.read().splitlines()
+    except OSError:
+        source_lines = []
+    print(profiler.report(source_lines), file=stream)
+    if output_path is None:
+        output_path = os.path.splitext(os.path.basename(source_path))[0] + ".prof"
+    if output_path.endswith(".json"):
+        profiler.save_speedscope(output_path, source_path)
+    else:
+        profiler.save_pstats(output_path, source_path)
+    print(f"\nProfile written to {output_path}", file=stream)
@@ -1,11 +1,20 @@
 # pathetic/runner.py
 
-from pathetic.interpreter import interpret
+from pathetic.cache import load_code
+from pathetic.errors import PatheticError
+from pathetic.interpreter import default_interpreter
+from pathetic.optimizer import DEFAULT_OPT_LEVEL
 
-def run_file(filepath):
+def run_file(filepath, use_cache=True, output=None, input_source=None, profiler=None,
+             interpreter=None, limits=None, opt_level=DEFAULT_OPT_LEVEL):
+    interpreter = interpreter or default_interpreter
     try:
-        with open(filepath, 'r') as f:
-            code = f.read()
-            interpret(code)
+        code = load_code(filepath, use_cache, opt_level)
     except FileNotFoundError:
-        print(f"Error: File '{filepath}' not found.")
+        interpreter.report(f"Error: File '{filepath}' not found.")
+        return
+    except PatheticError as e:
+        interpreter.report(e)
+        return
+    interpreter.run_code(code, output=output, input_source=input_source, profiler=profiler,
+                         limits=limits)
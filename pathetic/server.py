@@ -0,0 +1,233 @@
+# pathetic/server.py
+#
+# `pathetic serve`: a resident interpreter behind a Unix socket.
+#
+# For short scripts, starting Python and importing the interpreter takes
+# far longer than the script itself. The server pays that once: it keeps a
+# pool of warm worker processes (see pathetic.batch) and answers run
+# requests on a Unix socket, so `pathetic run --server` only has to send
+# the program over and print the reply.
+#
+# The protocol is one JSON object per line. A connection carries one
+# request and one response:
+#
+#     {"source": "...", "input": "...", "timeout": 5, "limits": {"max_steps": 100000}}
+#     {"status": "ok", "duration": 0.0012, "output": "...", "errors": ""}
+#
+# "path" may replace "source" to run a file the server can read (through
+# the bytecode cache). "input" feeds get the way --no-prompt does.
+# "timeout" and "limits" (see pathetic.limits.Limits) can only tighten the
+# server's own. status is as for batch runs, plus "rejected" for a
+# malformed request.
+#
+# Only what the client needs is imported at module level; the interpreter
+# is loaded by the server.
+
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+
+
+def _default_socket():
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "pathetic.sock")
+    # A directory of this user's own, so that no one else can take the name first
+    return os.path.join(tempfile.gettempdir(), f"pathetic-{os.getuid()}", "pathetic.sock")
+
+
+# Where server and client meet when no socket is given
+DEFAULT_SOCKET = _default_socket()
+# Keys of a request's "limits": pathetic.limits.Limits arguments
+LIMIT_NAMES = ("max_steps", "time_limit", "max_memory", "max_array")
+# Compiled sources each worker keeps
+SOURCE_CACHE_SIZE = 256
+
+
+# --- Worker side ---
+
+_compile = None
+
+
+def _warm():
+    """Load everything a request needs, so the first one is fast too."""
+    global _compile
+    if _compile is None:
+        from functools import lru_cache
+        from .compiler import compile_source
+        _compile = lru_cache(maxsize=SOURCE_CACHE_SIZE)(compile_source)
+
+
+def run_request(source, path, input_data, timeout, use_cache, limits):
+    """Run one request in a worker; returns the response record.
+
+    limits is a pair of dictionaries of Limits arguments, the server's and
+    the request's.
+    """
+    import io
+    from .batch import run_captured
+    from .cache import load_code
+    from .inputs import TokenReader
+    from .limits import Limits
+
+    _warm()
+    input_source = TokenReader(io.BytesIO(input_data.encode("utf-8")))
+    limits = Limits(**limits[0]).tighten(Limits(**limits[1]))
+    if source is not None:
+        return run_captured(lambda: _compile(source), input_source, timeout, limits)
+    return run_captured(lambda: load_code(path, use_cache), input_source, timeout, limits)
+
+
+# --- Server side ---
+
+def _rejected(message):
+    return {"status": "rejected", "duration": 0.0, "output": "", "errors": f"Error: {message}\n"}
+
+
+def check_request(request):
+    """(source, path, input, timeout, limits) from a decoded request; raises ValueError."""
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+    source = request.get("source")
+    path = request.get("path")
+    if (source is None) == (path is None):
+        raise ValueError("Request needs exactly one of 'source' and 'path'")
+    if not isinstance(source if path is None else path, str):
+        raise ValueError("'source' and 'path' must be strings")
+    input_data = request.get("input", "")
+    if not isinstance(input_data, str):
+        raise ValueError("'input' must be a string")
+    timeout = request.get("timeout")
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                or timeout <= 0):
+        raise ValueError("'timeout' must be a positive number")
+    limits = request.get("limits") or {}
+    if not isinstance(limits, dict):
+        raise ValueError("'limits' must be a JSON object")
+    for name, value in limits.items():
+        if name not in LIMIT_NAMES:
+            raise ValueError(f"Unknown limit '{name}'")
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                  or value <= 0):
+            raise ValueError(f"Limit '{name}' must be a positive number")
+    return source, path, input_data, timeout, limits
+
+
+def _check_directory(socket_path, create):
+    """Make sure only this user can reach the default socket's directory,
+    creating it (mode 0700) if create is set; raises OSError."""
+    directory = os.path.dirname(socket_path)
+    if create:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    elif not os.path.exists(directory):
+        return
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise OSError(f"{directory} must be a directory that only you can access")
+
+
+def _limit(requested, limit):
+    """The smaller of two timeouts, where None or 0 means unlimited."""
+    if not limit:
+        return requested
+    if requested is None:
+        return limit
+    return min(requested, limit)
+
+
+def serve(socket_path=DEFAULT_SOCKET, jobs=None, timeout=None, use_cache=True, log=None,
+          limits=None):
+    """Answer run requests on socket_path until interrupted.
+
+    limits is a dictionary of Limits arguments applied to every request.
+    """
+    import socketserver
+    from concurrent.futures import ProcessPoolExecutor
+    from .batch import init_worker
+
+    log = log or sys.stderr
+    if socket_path == DEFAULT_SOCKET:
+        _check_directory(socket_path, create=True)
+    if os.path.exists(socket_path):
+        if _is_listening(socket_path):
+            raise OSError(f"A server is already listening on {socket_path}")
+        os.unlink(socket_path)
+
+    workers = jobs or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                source, path, input_data, requested, requested_limits = check_request(json.loads(line))
+            except ValueError as e:
+                response = _rejected(e)
+            else:
+                future = pool.submit(run_request, source, path, input_data,
+                                     _limit(requested, timeout), use_cache,
+                                     (limits or {}, requested_limits))
+                try:
+                    response = future.result()
+                except Exception as e:
+                    response = {"status": "crash", "duration": None, "output": "",
+                                "errors": f"{type(e).__name__}: {e}\n"}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+    class Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    # Start the workers now rather than on the first requests
+    for future in [pool.submit(_warm) for _ in range(workers)]:
+        future.result()
+    old_umask = os.umask(0o177)
+    try:
+        server = Server(socket_path, Handler)
+    finally:
+        os.umask(old_umask)
+    print(f"Serving on {socket_path} with {workers} worker(s)", file=log, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown(cancel_futures=True)
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+
+def _is_listening(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+# --- Client side ---
+
+def request(job, socket_path=DEFAULT_SOCKET):
+    """Send one job (a request dictionary) to the server; returns its response.
+
+    Raises OSError when no server is listening.
+    """
+    if socket_path == DEFAULT_SOCKET:
+        _check_directory(socket_path, create=False)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(job).encode("utf-8") + b"\n")
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as replies:
+            line = replies.readline()
+    if not line:
+        raise OSError(f"No response from the server on {socket_path}")
+    return json.loads(line)
@@ -0,0 +1,65 @@
+# pathetic/values.py
+
+import array
+import re
+
+# Backslash escapes in string literals; anything else after a backslash is
+# kept as written.
+ESCAPES = {
+    'n': '\n',
+    't': '\t',
+    'r': '\r',
+    'b': '\b',
+    'f': '\f',
+    'v': '\v',
+    '"': '"',
+    "'": "'",
+    '\\': '\\',
+}
+
+_ESCAPE = re.compile(r'\\(?:u([0-9a-fA-F]{4})|x([0-9a-fA-F]{2})|(.))', re.DOTALL)
+
+def _decode_escape(match):
+    code = match.group(1) or match.group(2)
+    if code:
+        return chr(int(code, 16))
+    return ESCAPES.get(match.group(3), match.group(0))
+
+def process_escape_sequences(s):
+    """Process escape sequences like \\n, \\t, \\\\, \\", \\u00e9 and \\x41 in one pass."""
+    if not isinstance(s, str) or '\\' not in s:
+        return s
+    return _ESCAPE.sub(_decode_escape, s)
+
+def parse_number(val):
+    """int for -?digits, float for -?digits.digits, otherwise None."""
+    digits = val[1:] if val[:1] == '-' else val
+    if digits.isdecimal():
+        return int(val)
+    whole, dot, fraction = digits.partition('.')
+    if dot and whole.isdecimal() and fraction.isdecimal():
+        return float(val)
+    return None
+
+def parse_value(val):
+    val = val.strip()
+    number = parse_number(val)
+    if number is not None:
+        return number
+    if val.startswith('"') and val.endswith('"'):
+        return process_escape_sequences(val[1:-1])
+    elif val.startswith("'") and val.endswith("'"):
+        return process_escape_sequences(val[1:-1])
+    return val
+
+def strip_quotes(s):
+    if isinstance(s, str) and len(s) >= 2:
+        if (s.startswith('"') and s.endswith('"')) or (s.startswith("'") and s.endswith("'")):
+            return process_escape_sequences(s[1:-1])
+    return s
+
+def format_value(value):
+    """Text for a value in say f"..." and printed expressions."""
+    if isinstance(value, array.array):
+        return str(value.tolist())
+    return str(value)
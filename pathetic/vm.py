@@ -0,0 +1,612 @@
+# pathetic/vm.py
+#
+# Dispatch loop for the bytecode produced by pathetic.compiler.
+
+import math
+import operator
+import time
+from collections import OrderedDict
+
+from .compiler import (
+    CALL, FOR_NEXT, FOR_RANGE, GET, JUMP, JUMP_IF_FALSE, LET_ARRAY,
+    MAKE_FUNCTION, PARALLEL_FOR, PRINT, RETURN, RETURN_CONST, SAY, SAY_F, STORE_FAST,
+    STORE_FAST_CONST, STORE_NAME, STORE_ITEM, STORE_NAME_CONST, TAIL_CALL,
+    UNBOUND, Code, reachable,
+)
+from . import parallel
+from .arrays import BUILTINS, make_array
+from .errors import PatheticError, PatheticRuntimeError
+from .expressions import evaluation_error, render_fstring
+from .instrument import combine
+from .output import make_sink
+from .values import format_value, parse_value
+
+
+class Frame:
+    """Activation record for one call.
+
+    A frame owns only its slots; names it does not hold are looked up in
+    the shared globals, so creating one costs O(number of callee locals).
+    Frames also act as a read-only mapping over that chain, which is what
+    f-strings and error messages evaluate against.
+    """
+
+    __slots__ = ("code", "locals", "globals", "pc")
+
+    def __init__(self, code, locals, globals):
+        self.code = code
+        self.locals = locals
+        self.globals = globals
+        # Where to resume once a call made from this frame returns
+        self.pc = 0
+
+    def __getitem__(self, name):
+        slot = self.code.slotmap.get(name)
+        if slot is not None:
+            value = self.locals[slot]
+            if value is not UNBOUND:
+                return value
+        return self.globals[name]
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+
+class Count:
+    """Iterator for a counted loop that cannot use range(), e.g. a float start.
+
+    It steps exactly like the general loop would, and keeps the first value
+    that failed the test in .value, which is where the loop variable ends up.
+    """
+
+    __slots__ = ("value", "bound", "step", "test")
+
+    _TESTS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+    def __init__(self, start, bound, comparison, step):
+        self.value = start
+        self.bound = bound
+        self.step = step
+        self.test = self._TESTS[comparison]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        value = self.value
+        if not self.test(value, self.bound):
+            raise StopIteration
+        self.value = value + self.step
+        return value
+
+
+def counted_values(start, bound, comparison, step):
+    """The range of a counted loop's values, or None when it cannot be a range."""
+    if type(start) is not int or not (type(bound) is int or (type(bound) is float and math.isfinite(bound))):
+        return None
+    if comparison == "<":
+        stop = math.ceil(bound)
+    elif comparison == "<=":
+        stop = math.floor(bound) + 1
+    elif comparison == ">":
+        stop = math.floor(bound)
+    else:
+        stop = math.ceil(bound) - 1
+    return range(start, stop, step)
+
+
+def counted_range(start, bound, comparison, step):
+    """Iterator over a counted loop's values, and the variable's value afterwards.
+
+    When the value afterwards is not known up front the Count iterator is
+    returned in its place.
+    """
+    values = counted_values(start, bound, comparison, step)
+    if values is not None:
+        return iter(values), start + len(values) * step
+    counter = Count(start, bound, comparison, step)
+    return counter, counter
+
+
+# Argument and result types an @memo function caches; arrays are mutable.
+MEMO_TYPES = (int, float, str, bool)
+
+
+def memo_key(values):
+    """The cache key for a memoized call's argument values, or None when
+    they cannot be cached."""
+    kinds = tuple(map(type, values))
+    if all(kind is int for kind in kinds):
+        return values
+    if not all(kind in MEMO_TYPES for kind in kinds):
+        return None
+    # 1, 1.0 and True are equal but give different results
+    return values + kinds
+
+
+class Memo:
+    """The results cached for one @memo function during a run.
+
+    A result can depend on global variables as well as on the arguments:
+    the globals that the function, or any function it can call, reads are
+    part of the key.
+    """
+
+    __slots__ = ("results", "size", "cached", "globals")
+
+    def __init__(self, code, globals=()):
+        self.results = OrderedDict()
+        self.size = code.memo
+        self.globals = globals
+        # Frames for cache hits run this: code's variables plus the
+        # result in an extra slot, which it returns
+        self.cached = Code(code.name, code.params, code.varnames + ["$memo"])
+        self.cached.instructions = [(RETURN, lambda L, G: L[-1], None)]
+        self.cached.lines = [None]
+        self.cached.sources = [None]
+
+
+class Pending:
+    """On the call stack above the caller of a memoized call that missed:
+    the result returned through it is stored in the cache."""
+
+    __slots__ = ("memo", "key")
+
+    def __init__(self, memo, key):
+        self.memo = memo
+        self.key = key
+
+    def store(self, value):
+        if type(value) in MEMO_TYPES:
+            results = self.memo.results
+            results[self.key] = value
+            if len(results) > self.memo.size:
+                results.popitem(last=False)
+
+
+# Deepest chain of pending (non-tail) calls before a run is stopped.
+MAX_DEPTH = 2_000_000
+
+# Longest a cooperative run keeps the event loop waiting, in seconds.
+TIME_SLICE = 0.005
+
+
+def input_prompt(name, size):
+    """What get(name) or get(name[size]) asks when reading interactively."""
+    if size is None:
+        return f"Enter value for {name}: "
+    return f"Enter {size} space-separated values for {name}: "
+
+
+def parse_input(text, name, size, line):
+    """The value get(name) or get(name[size]) stores for a line of input."""
+    if size is None:
+        return parse_value(text.strip())
+    val = text.strip().split()
+    if len(val) < size:
+        raise PatheticRuntimeError(
+            f"Input error: Expected {size} values, got {len(val)} at line {line}")
+    return make_array([parse_value(v) for v in val[:size]], size)
+
+
+class VM:
+    def __init__(self, functions, max_depth=MAX_DEPTH, output=None, input_source=None,
+                 profiler=None, instrumentation=None, limits=None):
+        # Function table shared with the caller: name -> Code
+        self.functions = functions
+        self.max_depth = max_depth
+        # say output: an OutputSink, a stream, or None for stdout
+        self.output = make_sink(output)
+        # get input: a TokenReader, or None to prompt and read lines from stdin
+        self.input_source = input_source
+        # Told about every instruction, call and I/O (see pathetic.instrument):
+        # a Profiler, an Instrumentation, both, or None
+        self.tracer = combine(profiler, instrumentation)
+        # Step, time and memory budgets (a pathetic.limits.Limits), or None
+        self.limits = limits
+        self.budget = None
+        # Set by run_async: execute pauses for input and every few steps
+        self.cooperative = False
+        # Function name -> Memo, for @memo functions called in this run
+        self.memos = {}
+
+    def begin(self, code, env):
+        """The frame for a run of a top-level Code object with variables stored in env."""
+        frame = Frame(code, [UNBOUND] * len(code.varnames), env)
+        if self.limits is not None:
+            self.budget = self.limits.start()
+        if self.tracer is not None:
+            self.tracer.start(frame)
+        return frame
+
+    def end(self):
+        if self.tracer is not None:
+            self.tracer.stop()
+        self.output.flush()
+
+    def run(self, code, env):
+        """Run a top-level Code object with variables stored in env."""
+        frame = self.begin(code, env)
+        try:
+            # Not cooperative, so execute finishes without ever pausing
+            next(self.execute(frame))
+        except StopIteration as done:
+            return done.value
+        finally:
+            self.end()
+
+    async def run_async(self, code, env, reader, writer):
+        """Run code as run does, sharing the thread with other asyncio tasks.
+
+        Without an input_source, get prompts on writer and awaits a line
+        from reader (an asyncio.StreamReader or anything with an async
+        readline()). Output goes to writer (an asyncio.StreamWriter, or
+        anything with write() and an optional async drain()) whenever the
+        program waits for input, at least every TIME_SLICE seconds while it
+        runs, and at the end; the event loop gets control at those points.
+        """
+        import asyncio
+        from .limits import Limits
+
+        pending = []
+        self.output = make_sink(_Collector(pending), 1 << 16)
+        self.cooperative = True
+        if self.limits is None:
+            # Only for the step countdown that tells execute when to pause
+            self.limits = Limits()
+        frame = self.begin(code, env)
+        steps = self.execute(frame)
+        deadline = time.monotonic() + TIME_SLICE
+        request = None
+        try:
+            while True:
+                if request is None:
+                    request = steps.send(None)
+                else:
+                    text = await reader.readline()
+                    if not text:
+                        request = steps.throw(PatheticRuntimeError(
+                            f"Input error: No input left for {request[0]} at line {request[2]}"))
+                        continue
+                    if isinstance(text, bytes):
+                        text = text.decode("utf-8", "replace")
+                    request = steps.send(text)
+                if request is not None or time.monotonic() >= deadline:
+                    # Waiting for input, or the slice is used up
+                    self.output.flush()
+                    await _drain(writer, pending)
+                    await asyncio.sleep(0)
+                    deadline = time.monotonic() + TIME_SLICE
+        except StopIteration as done:
+            return done.value
+        finally:
+            steps.close()
+            self.end()
+            await _drain(writer, pending)
+
+    def enter(self, name, argfns, L, G, line):
+        """Build the frame for a call to name; arguments are evaluated in the caller."""
+        func = self.functions.get(name)
+        if func is None:
+            raise PatheticRuntimeError(f"Syntax error: Undefined function '{name}' at line {line}")
+        params = func.params
+        if len(argfns) != len(params):
+            raise PatheticRuntimeError(
+                f"Syntax error: Function '{name}' expects {len(params)} arguments, "
+                f"got {len(argfns)} at line {line}")
+        slots = [fn(L, G) for fn in argfns]
+        if len(func.varnames) > len(slots):
+            slots.extend([UNBOUND] * (len(func.varnames) - len(slots)))
+        return Frame(func, slots, G)
+
+    def recall(self, callee):
+        """For a call to a memoized function: the frame to run instead,
+        and the Pending to push when the result is not cached yet."""
+        code = callee.code
+        memo = self.memos.get(code.name)
+        if memo is None:
+            memo = self.memos[code.name] = self.make_memo(code)
+        if memo is False:
+            return callee, None
+        values = tuple(callee.locals[:len(code.params)])
+        if memo.globals:
+            G = callee.globals
+            values += tuple([G.get(name, UNBOUND) for name in memo.globals])
+        key = memo_key(values)
+        if key is None:
+            return callee, None
+        results = memo.results
+        value = results.get(key, UNBOUND)
+        if self.tracer is not None:
+            self.tracer.memo(code.name, value is not UNBOUND)
+        if value is UNBOUND:
+            return callee, Pending(memo, key)
+        results.move_to_end(key)
+        callee.locals.append(value)
+        return Frame(memo.cached, callee.locals, callee.globals), None
+
+    def make_memo(self, code):
+        """A Memo for code, or False when a function it can call has a side
+        effect -- one the compiler could not see, defined by an earlier
+        program run in the same interpreter -- and calls must not be cached."""
+        functions = {name: (func,) for name, func in self.functions.items()}
+        reads = set()
+        for func in reachable(code, functions):
+            if func.effect is not None:
+                return False
+            reads.update(func.reads)
+        return Memo(code, tuple(sorted(reads)))
+
+    def call_builtin(self, name, argfns, L, G, line):
+        func, least, most = BUILTINS[name]
+        if len(argfns) < least or (most is not None and len(argfns) > most):
+            expected = least if least == most else f"at least {least}"
+            raise PatheticRuntimeError(
+                f"Syntax error: Function '{name}' expects {expected} arguments, "
+                f"got {len(argfns)} at line {line}")
+        return func(*[fn(L, G) for fn in argfns])
+
+    # --- Dispatch loop ---
+
+    def execute(self, frame):
+        """Run frame to completion; a generator that returns the result.
+
+        Calls never recurse in Python: the caller is pushed on an explicit
+        stack and its pc saved in the frame, and a tail call replaces the
+        current frame outright, so Pathetic recursion depth is bounded only
+        by max_depth and memory.
+
+        When cooperative, it yields None every few steps so the caller can
+        let other work run, and (name, size, line) when get needs a line of
+        input, which the caller sends back. Otherwise it never yields.
+        """
+        stack = []
+        write = self.output.write
+        tracer = self.tracer
+        budget = self.budget
+        cooperative = self.cooperative
+        # Steps left until the budget is checked again
+        ticks = budget.interval if budget is not None else 0
+        code = frame.code
+        L, G = frame.locals, frame.globals
+        ops = code.link()
+        pc = 0
+        try:
+            while True:
+                op, a, b = ops[pc]
+                if tracer is not None:
+                    tracer.step(frame, pc)
+                pc += 1
+                if op == STORE_FAST:
+                    L[a] = b(L, G)
+                    if budget is not None:
+                        budget.check_value(L[a], L, G, stack, code.lines[pc - 1])
+                elif op == JUMP_IF_FALSE:
+                    if not a(L, G):
+                        pc = b
+                elif op == FOR_NEXT:
+                    value = next(L[a[0]], UNBOUND)
+                    if value is UNBOUND:
+                        value = L[a[1]]
+                        if type(value) is Count:
+                            value = value.value
+                        pc = a[2]
+                    if type(b) is int:
+                        L[b] = value
+                    else:
+                        G[b] = value
+                elif op == STORE_NAME:
+                    G[a] = b(L, G)
+                    if budget is not None:
+                        budget.check_value(G[a], L, G, stack, code.lines[pc - 1])
+                elif op == JUMP:
+                    if budget is not None and a < pc:
+                        # A loop going round
+                        ticks -= 1
+                        if not ticks:
+                            ticks = budget.refill(L, G, stack, code.lines[pc - 1])
+                            if cooperative:
+                                yield None
+                    pc = a
+                elif op == STORE_FAST_CONST:
+                    L[a] = b
+                elif op == STORE_NAME_CONST:
+                    G[a] = b
+                elif op == CALL or op == TAIL_CALL:
+                    if a[0] in BUILTINS and a[0] not in self.functions:
+                        value = self.call_builtin(a[0], a[1], L, G, code.lines[pc - 1])
+                        if b is not None:
+                            self.store(L, G, b, value)
+                            if budget is not None:
+                                budget.check_value(value, L, G, stack, code.lines[pc - 1])
+                        continue
+                    callee = self.enter(a[0], a[1], L, G, code.lines[pc - 1])
+                    pending = None
+                    if callee.code.memo is not None:
+                        callee, pending = self.recall(callee)
+                    if budget is not None:
+                        ticks -= 1
+                        if not ticks:
+                            ticks = budget.refill(L, G, stack, code.lines[pc - 1])
+                            if cooperative:
+                                yield None
+                    if op == CALL:
+                        frame.pc = pc
+                        stack.append(frame)
+                        if len(stack) > self.max_depth:
+                            raise PatheticRuntimeError(
+                                f"Runtime error: maximum call depth exceeded in '{a[0]}'")
+                    if pending is not None:
+                        stack.append(pending)
+                    if tracer is not None:
+                        if op == CALL:
+                            tracer.call(callee, frame, pc - 1)
+                        else:
+                            tracer.tail_call(callee)
+                    frame = callee
+                    code = frame.code
+                    L = frame.locals
+                    ops = code.link()
+                    pc = 0
+                elif op == RETURN or op == RETURN_CONST:
+                    value = a(L, G) if op == RETURN else a
+                    if tracer is not None:
+                        tracer.ret(value)
+                    if not stack:
+                        return value
+                    frame = stack.pop()
+                    while type(frame) is Pending:
+                        frame.store(value)
+                        if not stack:
+                            return value
+                        frame = stack.pop()
+                    code = frame.code
+                    L = frame.locals
+                    ops = code.ops
+                    pc = frame.pc
+                    # The caller is parked just past its CALL instruction
+                    _, call, dest = ops[pc - 1]
+                    if dest is not None:
+                        if value is None and call[2]:
+                            raise PatheticRuntimeError(
+                                f"Syntax error: Function '{call[0]}' returned None at line {code.lines[pc - 1]}")
+                        if type(dest) is int:
+                            L[dest] = value
+                        else:
+                            G[dest] = value
+                        if budget is not None:
+                            budget.check_value(value, L, G, stack, code.lines[pc - 1])
+                elif op == FOR_RANGE:
+                    dest, iterator, end = a
+                    start = L[dest] if type(dest) is int else G[dest]
+                    L[iterator], L[end] = counted_range(start, b[0](L, G), b[1], b[2])
+                elif op == STORE_ITEM:
+                    value = b[1](L, G)
+                    a(L, G)[b[0](L, G)] = value
+                    if budget is not None:
+                        budget.check_value(value, L, G, stack, code.lines[pc - 1])
+                elif op == PARALLEL_FOR:
+                    # Traced, limited and cooperative runs keep to one thread
+                    if tracer is None and budget is None and parallel.enabled:
+                        if parallel.run_loop(self.functions, frame, a, b):
+                            pc = b[3]
+                elif op == SAY_F:
+                    text = a(L, G)
+                    write(text)
+                    if tracer is not None:
+                        tracer.say(text)
+                elif op == SAY:
+                    write(a)
+                    if tracer is not None:
+                        tracer.say(a)
+                elif op == PRINT:
+                    text = format_value(a(L, G)) + "\n"
+                    write(text)
+                    if tracer is not None:
+                        tracer.say(text)
+                elif op == MAKE_FUNCTION:
+                    self.functions[a.name] = a
+                    # A new definition may change what any cached call would return
+                    self.memos.clear()
+                elif op == LET_ARRAY:
+                    size, values = b
+                    if budget is not None:
+                        budget.check_array(size, code.lines[pc - 1])
+                    self.store(L, G, a, make_array(values, size))
+                elif op == GET:
+                    if budget is not None and b[1] is not None:
+                        budget.check_array(b[1], code.lines[pc - 1])
+                    if cooperative and self.input_source is None:
+                        self.output.write(input_prompt(b[0], b[1]))
+                        text = yield (b[0], b[1], code.lines[pc - 1])
+                        value = parse_input(text, b[0], b[1], code.lines[pc - 1])
+                    else:
+                        value = self.read_input(b[0], b[1], code.lines[pc - 1])
+                    self.store(L, G, a, value)
+                    if budget is not None:
+                        budget.check_value(value, L, G, stack, code.lines[pc - 1])
+                    if tracer is not None:
+                        tracer.get(b[0], value)
+        except PatheticError:
+            raise
+        except Exception as e:
+            raise PatheticRuntimeError(self.describe(frame, pc - 1, e)) from None
+
+    def store(self, L, G, dest, value):
+        if type(dest) is int:
+            L[dest] = value
+        else:
+            G[dest] = value
+
+    def read_input(self, name, size, line):
+        source = self.input_source
+        if source is not None:
+            if size is None:
+                return source.read_value(name, line)
+            return source.read_values(name, size, line)
+        self.prompt(input_prompt(name, size))
+        return parse_input(input(), name, size, line)
+
+    def prompt(self, text):
+        # Everything said so far must be visible before waiting for input
+        self.output.write(text)
+        self.output.flush()
+
+    def describe(self, frame, index, error):
+        """Turn an exception raised by instruction `index` into a message."""
+        code = frame.code
+        source = code.sources[index]
+        if code.instructions[index][0] == SAY_F:
+            # Re-render the slow way to find which {...} failed
+            text = render_fstring(source, frame)
+            if text.startswith("Formatting error"):
+                return text
+            return f"Formatting error: {error}"
+        if source is None:
+            return f"Runtime error: {error} at line {code.lines[index]}"
+        if isinstance(error, KeyError) and error.args and error.args[0] not in frame:
+            error = NameError(f"name '{error.args[0]}' is not defined")
+        return evaluation_error(error, source, frame)
+
+
+class _Collector:
+    """The stream behind a cooperative run's OutputSink: keeps text for _drain."""
+
+    def __init__(self, pending):
+        self.pending = pending
+
+    def write(self, text):
+        self.pending.append(text)
+
+
+async def _drain(writer, pending):
+    """Hand the collected output to an async writer."""
+    if not pending:
+        return
+    text = "".join(pending)
+    pending.clear()
+    await write_async(writer, text)
+
+
+async def write_async(writer, text):
+    """Write text to an asyncio.StreamWriter (as UTF-8), or to anything with
+    write() and an optional async drain()."""
+    import asyncio
+
+    if isinstance(writer, asyncio.StreamWriter):
+        writer.write(text.encode("utf-8"))
+    else:
+        writer.write(text)
+    drain = getattr(writer, "drain", None)
+    if drain is not None:
+        await drain()